@@ -0,0 +1,105 @@
+"""Compare the HTTP+lxml and Selenium extraction backends on saved product pages.
+
+Serves every ``*.html`` file of a corpus directory from a local HTTP server and
+extracts them with each backend, reporting pages/second and resident memory.
+
+    python -m benchmarks.extractor_backends --corpus path/to/pages
+    python -m benchmarks.extractor_backends --corpus path/to/pages \
+        --backend selenium --hub http://localhost:4444/wd/hub --serve-host 172.17.0.1
+
+Browser memory for the Selenium backend lives on the grid node, so its RSS
+column only covers this process; compare node memory in the grid UI.
+"""
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import argparse
+import os
+import resource
+import threading
+import time
+
+from src.extractors import HttpExtractor, extract_with_driver, is_complete
+
+
+def current_rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    # Not on Linux: fall back to the peak RSS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_corpus(corpus, port):
+    handler = partial(QuietHandler, directory=corpus)
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_http(urls):
+    extractor = HttpExtractor()
+    for url in urls:
+        yield is_complete(extractor.extract(url))
+
+
+def run_selenium(urls, hub):
+    from selenium import webdriver
+
+    options = webdriver.FirefoxOptions()
+    options.add_argument("headless")
+    driver = webdriver.Remote(hub, options=options)
+    try:
+        for url in urls:
+            driver.get(url)
+            yield is_complete(extract_with_driver(driver))
+    finally:
+        driver.quit()
+
+
+def measure(name, results, pages):
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    complete = sum(1 for ok in results if ok)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<9} pages={pages:<5} complete={complete:<5} "
+        f"pages/s={pages / elapsed:8.2f} rss={current_rss_mb():7.1f}MB "
+        f"(+{current_rss_mb() - rss_before:.1f}MB)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", required=True, help="Directory of saved product pages (*.html)")
+    parser.add_argument("--backend", choices=("http", "selenium", "both"), default="http")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the corpus")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve-host", default="127.0.0.1", help="Corpus host as seen by the browser")
+    parser.add_argument("--hub", default=os.getenv("SELENIUM_HUB_URL", "http://localhost:4444/wd/hub"))
+    args = parser.parse_args()
+
+    pages = sorted(name for name in os.listdir(args.corpus) if name.endswith(".html"))
+    if not pages:
+        parser.error(f"No .html files in {args.corpus}")
+
+    server = serve_corpus(args.corpus, args.port)
+    try:
+        if args.backend in ("http", "both"):
+            urls = [f"http://127.0.0.1:{args.port}/{page}" for page in pages] * args.rounds
+            measure("http", run_http(urls), len(urls))
+        if args.backend in ("selenium", "both"):
+            urls = [f"http://{args.serve_host}:{args.port}/{page}" for page in pages] * args.rounds
+            measure("selenium", run_selenium(urls, args.hub), len(urls))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Check with EXPLAIN that the hot queries of the scraper and the listing use indexes.
+
+Creates the schema in a throwaway MySQL database, runs the migrations, seeds
+it with synthetic titles and prints the plan of every query below. The exit
+status is 1 when one of them reads a whole table or a whole index. The queue
+statements come straight from ``WorkQueue.hot_queries``.
+
+    python -m benchmarks.query_plans --rows 20000 --mysql-host 127.0.0.1 --password secret
+
+Like ``benchmarks.scrape_pipeline``, this drops and recreates the tables of
+``--database``; never point it at the application's database.
+"""
+import argparse
+import os
+import sys
+import time
+
+from benchmarks.scrape_pipeline import configure_environment, reset_database
+
+# Same shape as the queries in src/, with representative parameters
+HOT_QUERIES = (
+    (
+        "availability scan",
+        "SELECT id, title, url, availability, cover, volatility, price, fingerprint, page_etag, page_last_modified "
+        "FROM manga WHERE next_check_at <= %s ORDER BY next_check_at LIMIT %s",
+        lambda now: (now, 500),
+    ),
+    (
+        "listing page",
+        "SELECT id, title, price, availability, cover, trama, url FROM manga WHERE id > %s ORDER BY id LIMIT %s",
+        lambda now: (1000, 51),
+    ),
+    (
+        "listing, available only",
+        "SELECT id, title, price, availability, cover, trama, url FROM manga "
+        "WHERE id > %s AND is_available = %s ORDER BY id LIMIT %s",
+        lambda now: (1000, True, 51),
+    ),
+    (
+        "listing, price range",
+        "SELECT id, title, price, availability, cover, trama, url FROM manga "
+        "WHERE price >= %s AND price <= %s ORDER BY id LIMIT %s",
+        lambda now: (7.0, 7.5, 51),
+    ),
+    (
+        "ASIN lookup",
+        "SELECT asin FROM manga WHERE asin IN (%s, %s)",
+        lambda now: ("B000000001", "B000000002"),
+    ),
+    (
+        "missing covers",
+        "SELECT m.id, m.cover FROM manga m LEFT JOIN cover_sources s ON s.url_hash = SHA2(m.cover, 256) "
+        "WHERE m.cover_hash IS NULL AND m.cover IS NOT NULL AND (s.retry_after IS NULL OR s.retry_after <= %s) "
+        "LIMIT %s",
+        lambda now: (now, 500),
+    ),
+    (
+        "queue leased rows",
+        "SELECT id, url, attempts FROM urls WHERE lease_token = %s ORDER BY id",
+        lambda now: ("00000000-0000-0000-0000-000000000000",),
+    ),
+    (
+        "full-text search",
+        "SELECT id, title, series, volume, price, availability, cover, url, "
+        "MATCH (title, trama) AGAINST (%s IN BOOLEAN MODE) AS score FROM manga "
+        "WHERE MATCH (title, trama) AGAINST (%s IN BOOLEAN MODE) ORDER BY score DESC, id LIMIT %s OFFSET %s",
+        lambda now: ("+seed* +manga* +123*", "+seed* +manga* +123*", 31, 0),
+    ),
+    (
+        "series volumes",
+        "SELECT id, title, series, volume, price, availability, cover, url FROM manga "
+        "WHERE series = %s ORDER BY volume IS NULL, volume, id",
+        lambda now: ("Seed Manga",),
+    ),
+    (
+        "price history",
+        "SELECT observed_at, price, available FROM manga_history "
+        "WHERE manga_id = %s AND observed_at >= %s AND observed_at <= %s",
+        lambda now: (42, int(now) - 90 * 86400, int(now)),
+    ),
+)
+
+
+def seed(conn, rows, now):
+    cursor = conn.cursor()
+    batch = []
+    for number in range(rows):
+        asin = f"B0{number:08d}"
+        batch.append((
+            f"Seed Manga {number}", f"https://www.amazon.it/dp/{asin}", 5 + number % 2000 / 100,
+            "Yes" if number % 3 else "No", "4.5", f"https://m.media-amazon.com/images/{asin}.jpg",
+            # Most covers are already downloaded, most titles are not due yet
+            None if number % 50 == 0 else f"{number:064x}", asin, now + number % 86400, f"{number:064x}", number,
+        ))
+        if len(batch) == 1000 or number == rows - 1:
+            cursor.executemany(
+                "INSERT INTO manga (title, url, price, availability, rating, cover, cover_hash, asin, next_check_at, "
+                "fingerprint, series, volume) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, LEFT(%s, 16), 'Seed Manga', %s)",
+                batch,
+            )
+            cursor.executemany(
+                "INSERT INTO urls (url, asin, status, available_at) VALUES (%s, %s, 'done', 0)",
+                [(row[1], row[7]) for row in batch],
+            )
+            batch = []
+    cursor.execute(
+        "INSERT INTO manga_history (manga_id, observed_at, price, available) "
+        "SELECT id, %s, price, is_available FROM manga",
+        (int(now) - 86400,),
+    )
+    conn.commit()
+    for table in ("manga", "urls", "manga_history"):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic titles to seed")
+    parser.add_argument("--mysql-host", default="127.0.0.1")
+    parser.add_argument("--mysql-port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.getenv("MYSQL_PASSWD", ""))
+    parser.add_argument("--database", default="manga_benchmark")
+    args = parser.parse_args()
+
+    if args.database == os.getenv("DB", "mangas"):
+        parser.error(f"Refusing to wipe {args.database}, pick a dedicated --database")
+
+    # configure_environment also expects the scrape benchmark's knobs
+    args.backend, args.workers, args.pages = "http", 1, args.rows
+    configure_environment(args)
+    conn = reset_database(args)
+
+    from src import utils
+    from src.migrations import explain, full_scans
+
+    utils.create_tables()
+    now = time.time()
+    seed(conn, args.rows, now)
+
+    queries = [(name, query, params(now)) for name, query, params in HOT_QUERIES]
+    queries += utils.url_queue.hot_queries(now)
+
+    failures = 0
+    cursor = conn.cursor()
+    for name, query, params in queries:
+        plan = explain(cursor, query, params)
+        scans = full_scans(plan)
+        failures += bool(scans)
+        print(f"{'FULL SCAN' if scans else 'ok':<9} {name}")
+        for step in plan:
+            print(f"          table={step.get('table')} type={step.get('type')} key={step.get('key')} "
+                  f"rows={step.get('rows')} extra={step.get('Extra')}")
+    cursor.close()
+    utils.driver_pool.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
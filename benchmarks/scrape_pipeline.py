@@ -0,0 +1,338 @@
+"""Run the URL scanner and the availability scan end to end against a local stand-in for Amazon.
+
+Product pages are rendered from the templates in ``benchmarks/corpus`` (in stock,
+out of stock, no price, no rating, no description) and served at
+``/dp/<ASIN>`` by a local HTTP server, with ETags unless ``--no-etags`` is
+given, plus a small JPEG cover for each title. The real ``url_scanner`` and
+``availability_scan`` then run against a throwaway MySQL database, and the
+benchmark reports pages/s, p50/p99 per-page latency, DB round-trips per page
+and peak memory for each phase.
+
+    docker compose up -d mysql
+    python -m benchmarks.scrape_pipeline --pages 500 --mysql-host 127.0.0.1 --password secret
+
+Save a run with ``--save results.json`` and compare later runs against it with
+``--baseline results.json``; the exit status is 1 when a phase is slower or
+does more round-trips per page than the baseline allows.
+
+The benchmark drops and recreates every table of ``--database``, never point
+it at the application's database. Round-trips are read from the server-wide
+``Questions`` counter, so keep other clients off the server while it runs.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+
+import argparse
+import io
+import json
+import os
+import re
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+VARIANTS = ("in_stock", "out_of_stock", "no_price", "no_rating", "no_description")
+TABLES = (
+    "manga", "urls", "catalogue_version", "cover_blobs", "cover_sources", "manga_history", "notifications",
+    "schema_migrations", "leader_leases",
+)
+
+
+def load_templates():
+    templates = {}
+    for variant in VARIANTS:
+        with open(os.path.join(CORPUS, f"{variant}.html"), encoding="utf-8") as page:
+            templates[variant] = Template(page.read())
+    return templates
+
+
+def make_filler(kilobytes):
+    # Real product pages are mostly unrelated markup; parsing cost scales with it
+    block = (
+        '<div class="a-row a-spacing-small"><span class="a-list-item">'
+        '<a class="a-link-normal" href="/gp/bestsellers/books">Bestseller</a></span></div>\n'
+    )
+    return block * (kilobytes * 1024 // len(block))
+
+
+def make_cover():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 450), (180, 40, 40)).save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+class Site:
+    """State of the stand-in shop: which variant each ASIN serves."""
+
+    def __init__(self, asins, page_kb, etags=True):
+        self.etags = etags
+        self.templates = load_templates()
+        self.filler = make_filler(page_kb)
+        self.cover = make_cover()
+        self.variants = {asin: VARIANTS[i % len(VARIANTS)] for i, asin in enumerate(asins)}
+        self.base = None
+
+    def flip_stock(self, fraction):
+        """Swap in-stock and out-of-stock pages for `fraction` of those titles."""
+        flippable = [asin for asin, variant in self.variants.items() if variant in ("in_stock", "out_of_stock")]
+        for asin in flippable[:int(len(flippable) * fraction)]:
+            self.variants[asin] = "out_of_stock" if self.variants[asin] == "in_stock" else "in_stock"
+
+    def render(self, asin):
+        variant = self.variants.get(asin)
+        if variant is None:
+            return None
+        number = int(asin[2:])
+        return self.templates[variant].safe_substitute(
+            asin=asin,
+            base=self.base,
+            title=f"Benchmark Manga {number}",
+            price=f"{5 + number % 20},{number % 100:02d} €",
+            rating=f"4,{number % 10}",
+            filler=self.filler,
+        ).encode("utf-8")
+
+
+def serve(site, port, bind="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            page = re.fullmatch(r"/dp/([A-Z0-9]{10})", self.path)
+            cover = re.fullmatch(r"/images/([A-Z0-9]{10})\.jpg", self.path)
+            if page and (body := site.render(page.group(1))) is not None:
+                etag = f'"{site.variants[page.group(1)]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.reply(304, None, b"", etag)
+                else:
+                    self.reply(200, "text/html; charset=utf-8", body, etag)
+            elif cover and cover.group(1) in site.variants:
+                self.reply(200, "image/jpeg", site.cover)
+            else:
+                self.reply(404, "text/plain", b"Not Found")
+
+        def reply(self, status, content_type, body, etag=None):
+            self.send_response(status)
+            if content_type:
+                self.send_header("Content-Type", content_type)
+            if etag and site.etags:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((bind, port), Handler)
+    server.daemon_threads = True
+    site.base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure_environment(args):
+    # Read by src.utils at import time, so this must run before importing it
+    os.environ.update({
+        "MYSQL_HOST": args.mysql_host,
+        "MYSQL_PORT": str(args.mysql_port),
+        "MYSQL_USER": args.user,
+        "MYSQL_PASSWD": args.password,
+        "DB": args.database,
+        "EXTRACTOR_BACKEND": args.backend,
+        "SCRAPER_WORKERS": str(args.workers),
+        "HOST_MAX_CONCURRENT": str(args.workers),
+        "HOST_MIN_INTERVAL": "0",
+        "HOST_START_INTERVAL": "0",
+        "AVAILABILITY_BATCH_LIMIT": str(args.pages),
+    })
+
+
+def reset_database(args):
+    import mysql.connector
+
+    conn = mysql.connector.connect(
+        host=args.mysql_host, port=args.mysql_port, user=args.user, password=args.password
+    )
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`")
+    cursor.execute(f"USE `{args.database}`")
+    for table in TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+    conn.commit()
+    return conn
+
+
+def questions(conn):
+    cursor = conn.cursor()
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    count = int(cursor.fetchone()[1])
+    cursor.close()
+    return count
+
+
+def timing(fn, latencies):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+def run_phase(name, run, utils, handler_name, stats_conn):
+    """Run one scan with its per-page handler timed; returns the phase report."""
+    latencies = []
+    handler = getattr(utils, handler_name)
+    setattr(utils, handler_name, timing(handler, latencies))
+    # The Questions counter also counts this query, once per reading
+    before = questions(stats_conn) + 1
+    start = time.perf_counter()
+    try:
+        run()
+    finally:
+        setattr(utils, handler_name, handler)
+    elapsed = time.perf_counter() - start
+    round_trips = questions(stats_conn) - before
+    pages = len(latencies)
+    return {
+        "phase": name,
+        "pages": pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "round_trips_per_page": round(round_trips / pages, 2) if pages else 0.0,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def print_report(report):
+    print(
+        f"{report['phase']:<13} pages={report['pages']:<6} pages/s={report['pages_per_second']:<9} "
+        f"p50={report['p50_ms']}ms p99={report['p99_ms']}ms "
+        f"db round-trips/page={report['round_trips_per_page']} peak rss={report['peak_rss_mb']}MB"
+        + (f" traced peak={report['traced_peak_mb']}MB" if "traced_peak_mb" in report else "")
+    )
+
+
+def compare(reports, baseline, tolerance):
+    """Return the regressions of `reports` against a saved run."""
+    previous = {report["phase"]: report for report in baseline}
+    regressions = []
+    for report in reports:
+        old = previous.get(report["phase"])
+        if not old:
+            continue
+        if report["pages_per_second"] < old["pages_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{report['phase']}: {report['pages_per_second']} pages/s, baseline {old['pages_per_second']}"
+            )
+        if report["p99_ms"] > old["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{report['phase']}: p99 {report['p99_ms']}ms, baseline {old['p99_ms']}ms")
+        if report["round_trips_per_page"] > old["round_trips_per_page"]:
+            regressions.append(
+                f"{report['phase']}: {report['round_trips_per_page']} round-trips/page, "
+                f"baseline {old['round_trips_per_page']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500, help="Product pages in the stand-in shop")
+    parser.add_argument("--page-kb", type=int, default=200, help="Filler markup per page, in KB")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backend", choices=("http", "auto"), default="http")
+    parser.add_argument("--change-rate", type=float, default=0.2,
+                        help="Fraction of titles whose stock flips before the availability scan")
+    parser.add_argument("--no-etags", action="store_true",
+                        help="Serve pages without ETags, so every unchanged page is parsed again")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--mysql-host", default="127.0.0.1")
+    parser.add_argument("--mysql-port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default=os.getenv("MYSQL_PASSWD", ""))
+    parser.add_argument("--database", default="manga_benchmark")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Also report the traced Python heap peak (slows the run down)")
+    parser.add_argument("--log-file", default="logs/benchmark_log.txt")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed throughput and p99 regression against the baseline")
+    args = parser.parse_args()
+
+    if args.database == os.getenv("DB", "mangas"):
+        parser.error(f"Refusing to wipe {args.database}, pick a dedicated --database")
+
+    asins = [f"B0{number:08d}" for number in range(args.pages)]
+    site = Site(asins, args.page_kb, etags=not args.no_etags)
+    server = serve(site, args.port)
+
+    configure_environment(args)
+    stats_conn = reset_database(args)
+
+    from src.logging_setup import setup_logging
+    listener = setup_logging(args.log_file)
+    from src import utils
+
+    reports = []
+    try:
+        utils.create_tables()
+        utils.add_urls([f"{site.base}/dp/{asin}" for asin in asins])
+
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        def scan():
+            utils.url_scanner()
+            # Let the background cover downloads finish inside the measured phase
+            utils.cover_fetcher.executor.shutdown(wait=True)
+
+        reports.append(run_phase("url_scanner", scan, utils, "scrape_url", stats_conn))
+        if args.tracemalloc:
+            reports[-1]["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+            tracemalloc.reset_peak()
+
+        site.flip_stock(args.change_rate)
+        reports.append(run_phase("availability", utils.availability_scan, utils, "check_availability", stats_conn))
+        if args.tracemalloc:
+            reports[-1]["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    finally:
+        server.shutdown()
+        utils.driver_pool.shutdown()
+        listener.stop()
+
+    for report in reports:
+        print_report(report)
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump(reports, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as previous:
+            regressions = compare(reports, json.load(previous), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
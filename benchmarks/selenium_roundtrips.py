@@ -0,0 +1,118 @@
+"""Count WebDriver round-trips and time per page for the Selenium extraction.
+
+Loads the stand-in product pages of ``benchmarks.scrape_pipeline`` in a remote
+browser. Each page is extracted with the single-script ``extract_with_driver``
+and with the previous one-command-per-field routine, kept below for comparison.
+Page loads are not counted, only the extraction itself.
+
+    python -m benchmarks.selenium_roundtrips --hub http://localhost:4444/wd/hub --serve-host 172.17.0.1
+
+``--serve-host`` is the address of this machine as seen from the grid node.
+Use ``--implicit-wait`` to see what missing elements cost when the driver has
+an implicit wait configured.
+"""
+import argparse
+import os
+import statistics
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from benchmarks.scrape_pipeline import Site, serve
+from src.extractors import PRICE_SELECTOR, PRODUCT_FIELDS, extract_with_driver
+
+
+def legacy_extract_with_driver(driver):
+    """The per-field extraction that `extract_with_driver` replaced."""
+    product = dict.fromkeys(PRODUCT_FIELDS)
+    try:
+        product["title"] = driver.find_element(By.ID, 'productTitle').text
+    except NoSuchElementException:
+        pass
+    try:
+        driver.find_element(By.ID, 'outOfStock')
+        product["out_of_stock"] = True
+    except NoSuchElementException:
+        product["out_of_stock"] = False
+    price_element = driver.execute_script(f'return document.querySelector("{PRICE_SELECTOR}")')
+    if price_element:
+        product["price"] = driver.execute_script("return arguments[0].textContent", price_element)
+    try:
+        product["rating"] = driver.find_element(By.ID, "acrPopover").text
+    except NoSuchElementException:
+        pass
+    try:
+        book_description_div = driver.find_element(By.ID, "bookDescription_feature_div")
+        product["trama"] = book_description_div.find_element(By.TAG_NAME, "span").text
+    except NoSuchElementException:
+        pass
+    try:
+        product["cover"] = driver.find_element(By.ID, 'landingImage').get_attribute('src')
+    except NoSuchElementException:
+        pass
+    return product
+
+
+class CommandCounter:
+    """Counts the WebDriver commands sent by a driver."""
+
+    def __init__(self, driver):
+        self.count = 0
+        execute = driver.execute
+
+        def counting(command, params=None):
+            self.count += 1
+            return execute(command, params)
+
+        driver.execute = counting
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hub", default=os.getenv("SELENIUM_HUB_URL", "http://localhost:4444/wd/hub"))
+    parser.add_argument("--serve-host", default="127.0.0.1", help="This machine's address as seen by the browser")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--implicit-wait", type=float, default=0)
+    args = parser.parse_args()
+
+    asins = [f"B0{number:08d}" for number in range(args.pages)]
+    site = Site(asins, page_kb=200)
+    server = serve(site, 0, bind="0.0.0.0")
+    # Page and cover URLs must be reachable from the browser
+    site.base = base = site.base.replace("127.0.0.1", args.serve_host)
+
+    options = webdriver.FirefoxOptions()
+    options.add_argument("headless")
+    options.page_load_strategy = "eager"
+    driver = webdriver.Remote(args.hub, options=options)
+    driver.implicitly_wait(args.implicit_wait)
+    counter = CommandCounter(driver)
+
+    results = {"legacy": ([], []), "single script": ([], [])}
+    try:
+        for asin in asins:
+            driver.get(f"{base}/dp/{asin}")
+            for name, extract in (("legacy", legacy_extract_with_driver), ("single script", extract_with_driver)):
+                before = counter.count
+                start = time.perf_counter()
+                product = extract(driver)
+                results[name][0].append(time.perf_counter() - start)
+                results[name][1].append(counter.count - before)
+                if not product["title"]:
+                    print(f"{name}: no title on {asin}")
+    finally:
+        driver.quit()
+        server.shutdown()
+
+    for name, (seconds, commands) in results.items():
+        print(
+            f"{name:<14} round-trips/page={statistics.mean(commands):5.2f} "
+            f"ms/page mean={statistics.mean(seconds) * 1000:7.2f} "
+            f"median={statistics.median(seconds) * 1000:7.2f} max={max(seconds) * 1000:7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,40 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Form, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.executors.pool import ThreadPoolExecutor as JobExecutor
 
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from mysql.connector import Error
+
+from .bulk import EXPORT_MEDIA_TYPES, BulkFormatError, ImportParser, encode_export, import_format
+from .cache import LRUCache
+from .leader import LeaderLease
+from .logging_setup import setup_logging
+from .metrics import HTTP_REQUEST_SECONDS, job_tracker, mark_process_dead, metrics_registry
 from .utils import *
 
+from urllib.parse import urlencode
+
 import os
+import time
+import hashlib
+import functools
 import logging
 
-# setup loggers
-log_dir = "logs"
-
-if not os.path.exists:
-    os.makedirs(log_dir, exist_ok=True)
-
-logging.basicConfig(
-    filename="logs/api_log.txt",
-    filemode="w",
-    level=logging.INFO
+# setup loggers: records are queued and written by a background listener
+# to a size-rotated file, as JSON lines by default
+log_listener = setup_logging(
+    os.getenv('LOG_FILE', 'logs/api_log.txt'),
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    module_levels=os.getenv('LOG_LEVELS', ''),
+    max_bytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backup_count=int(os.getenv('LOG_BACKUP_COUNT', 5)),
+    fmt=os.getenv('LOG_FORMAT', 'json'),
 )
 
 # get root logger
@@ -30,53 +43,128 @@ logger = logging.getLogger(__name__)  # the __name__ resolve to "main" since we
 # Initialize FastAPI app
 app = FastAPI()
 
-# Delete the jobs.db file if it exists
-if os.path.exists("jobs.db"):
-    os.remove("jobs.db")
+# Scheduler settings: job intervals, worker threads and overlap policy
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true'
+SCAN_URL_INTERVAL = int(os.getenv('SCAN_URL_INTERVAL', 120))
+# Only titles that are due get checked at each tick
+AVAILABILITY_TICK_SECONDS = int(os.getenv('AVAILABILITY_TICK_SECONDS', 900))
+SCHEDULER_THREADS = int(os.getenv('SCHEDULER_THREADS', 4))
+JOB_MAX_INSTANCES = int(os.getenv('JOB_MAX_INSTANCES', 1))
+JOB_COALESCE = os.getenv('JOB_COALESCE', 'true').lower() == 'true'
+JOB_MISFIRE_GRACE_SECONDS = int(os.getenv('JOB_MISFIRE_GRACE_SECONDS', 60))
+SCHEDULER_TIMEZONE = os.getenv('SCHEDULER_TIMEZONE', 'CET')
 
-# Initialize APScheduler
+# Jobs are defined here at every start, so they are kept in memory: there is
+# nothing to persist and no jobs.db shared between workers
 scheduler = BackgroundScheduler(
-    jobstores={
-        "default": SQLAlchemyJobStore(url="sqlite:///jobs.db")  # Persistent job store
-    },
     executors={
-        "default": ThreadPoolExecutor(10),  # Adjust thread pool size as needed
+        "default": JobExecutor(SCHEDULER_THREADS),
+    },
+    job_defaults={
+        # A run still going when the next one is due makes the next one skip
+        "max_instances": JOB_MAX_INSTANCES,
+        # Runs missed while paused or busy collapse into a single one
+        "coalesce": JOB_COALESCE,
+        "misfire_grace_time": JOB_MISFIRE_GRACE_SECONDS,
     },
-    timezone="CET",  # Set your timezone
+    timezone=SCHEDULER_TIMEZONE,
 )
 
+# Every worker serves HTTP, only the lease holder runs the scans and delivers
+# notifications; another worker or replica takes over when it goes away
+def on_elected():
+    scheduler.resume()
+    telegram_dispatcher.start()
+
+def on_revoked():
+    scheduler.pause()
+    telegram_dispatcher.stop()
+
+scheduler_lease = LeaderLease(
+    db_pool.acquire,
+    db_pool.release,
+    name="scheduler",
+    ttl=int(os.getenv('LEADER_LEASE_SECONDS', 60)),
+    heartbeat=int(os.getenv('LEADER_HEARTBEAT_SECONDS', 15)),
+    on_elected=on_elected,
+    on_revoked=on_revoked,
+)
+
+def leader_only(job):
+    """Skip a run when this process lost the lease since the scheduler was resumed.
+
+    The job also gets the lease check as `keep_running`, to stop between
+    batches when the lease is lost while it runs.
+    """
+    @functools.wraps(job)
+    def run():
+        if not scheduler_lease.is_leader():
+            logger.info(f"{job.__name__} skipped, this worker is not the scheduler leader")
+            return None
+        return job(keep_running=scheduler_lease.is_leader)
+    return run
+
 scheduler.add_job(
     id="added_url_scanner",  # Unique job ID
-    func=scan_url_call,  # The function to run
+    func=leader_only(scan_url_call),  # The function to run
     trigger="interval",   # Interval-based scheduling
-    seconds=120,           # Runs every 120 seconds
+    seconds=SCAN_URL_INTERVAL,
 )
 
 scheduler.add_job(
     id="availability_scanner",  # Unique job ID
-    func=availability_call,  # The function to run
+    func=leader_only(availability_call),  # The function to run
     trigger="interval",   # Interval-based scheduling
-    seconds=10800,           # Runs every 10800 seconds (3 hours)
+    seconds=AVAILABILITY_TICK_SECONDS,
 )
 
+# Record the latency of every request, labelled by route template
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        ).observe(time.perf_counter() - start)
+
 # Serve static files (for Bootstrap and custom styles)
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
 
 # Set up Jinja2 templates directory
 templates = Jinja2Templates(directory="src/templates")
 
+# Rendered /list-all pages keyed on catalogue version and query
+listing_cache = LRUCache(max_entries=int(os.getenv('LIST_CACHE_ENTRIES', 256)))
+
 # Create Tables if not exist
 create_tables()
 
-# Start the scheduler when the application starts
+# Start the scheduler paused; it resumes once this worker holds the lease
 @app.on_event("startup")
 def start_scheduler():
-    scheduler.start()
+    scheduler.start(paused=True)
+    if SCHEDULER_ENABLED:
+        scheduler_lease.start()
 
 # Shutdown the scheduler when the application stops
 @app.on_event("shutdown")
 def shutdown_scheduler():
+    # Hand the lease over first so a standby worker can resume the jobs
+    scheduler_lease.stop()
     scheduler.shutdown()
+    telegram_dispatcher.stop()
+    cover_fetcher.shutdown()
+    driver_pool.shutdown()
+    mark_process_dead()
+    log_listener.stop()
 
 # Define the index route
 @app.get("/", response_class=HTMLResponse)
@@ -94,18 +182,24 @@ async def post_add_manga(request: Request, manga_urls: str = Form(...)):
     # Split the input by newlines to handle multiple URLs if entered
     urls_list = [url.strip() for url in manga_urls.splitlines() if url.strip()]
     
-    # For debugging purposes, print the URLs entered
-    logger.info("********************************")
-    logger.info("Manga URLs Submitted:", urls_list)
-    logger.info("********************************")
+    logger.info(f"{len(urls_list)} manga URLs submitted")
     
-    # Adding urls to the db for a later parsing
-    for url in urls_list:
-        clean_url = url.strip().lower()
-        add_url(clean_url)
+    # Adding urls to the db for a later parsing, in one batched transaction
+    try:
+        summary = add_urls(urls_list)
+    except Error:
+        return templates.TemplateResponse("add_manga.html", {
+            "request": request,
+            "submitted_urls": urls_list,
+            "error": "The database is unavailable, no URLs were added. Please try again later."
+        }, status_code=503)
 
     # Display a confirmation message in the response
-    message = f"URLs submitted and added to the database successfully!"
+    message = f"{summary['added']} URLs added to the database."
+    if summary["duplicates"]:
+        message += f" {summary['duplicates']} already tracked, skipped."
+    if summary["invalid"]:
+        message += f" {summary['invalid']} not Amazon product URLs, skipped."
     
     # Pass the submitted URLs and message back to the template for feedback
     return templates.TemplateResponse("add_manga.html", {
@@ -114,33 +208,237 @@ async def post_add_manga(request: Request, manga_urls: str = Form(...)):
         "message": message
     })
 
-@app.route('/list-all')
-def list_all(request: Request):
+# Bulk import: the body is parsed as it arrives and queued a batch at a time
+@app.post("/api/watchlist/import")
+async def import_watchlist(request: Request, format: str | None = None):
+    try:
+        parser = ImportParser(import_format(request.headers.get("content-type"), format))
+    except BulkFormatError as e:
+        return JSONResponse({"detail": str(e)}, status_code=415)
+
+    summary = {"added": 0, "duplicates": 0, "invalid": 0}
+    batch = []
+
+    async def queue(urls, final=False):
+        for url in urls:
+            if url is None:
+                summary["invalid"] += 1
+            else:
+                batch.append(url)
+        if batch and (final or len(batch) >= DB_BATCH_SIZE):
+            added = await run_in_threadpool(add_urls, batch)
+            for key in summary:
+                summary[key] += added[key]
+            batch.clear()
+
     try:
-        conn = create_connection(input_msg='List-all Route')
-        cursor = conn.cursor(dictionary=True)
-        query = "SELECT title, price, availability, cover, trama, url FROM manga"
-        cursor.execute(query)
-        mangas = cursor.fetchall()
+        async for chunk in request.stream():
+            await queue(parser.feed(chunk))
+        await queue(parser.close(), final=True)
+    except BulkFormatError as e:
+        # Entries before the error are already queued
+        return JSONResponse({"detail": str(e), "entries": parser.entries, **summary}, status_code=400)
+    except Error as e:
+        logger.error(f"Watchlist import aborted after {parser.entries} entries: {e}")
+        # The counts cover the batches queued before the failure
+        return JSONResponse(
+            {"detail": "Database unavailable", "entries": parser.entries, **summary}, status_code=503
+        )
+    logger.info(f"Watchlist import of {parser.entries} entries: {summary}")
+    return {"entries": parser.entries, **summary}
+
+# Bulk export, streamed a keyset chunk at a time
+@app.get("/api/watchlist/export")
+def export_watchlist(format: str = "ndjson", availability: str | None = None):
+    if format not in EXPORT_MEDIA_TYPES:
+        return JSONResponse({"detail": f"Unknown export format {format!r}"}, status_code=400)
+    return StreamingResponse(
+        encode_export(iter_catalogue(availability=availability), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="watchlist.{format}"'},
+    )
+
+def parse_price(value):
+    try:
+        return float(value.replace(',', '.')) if value else None
+    except ValueError:
+        return None
+
+@app.get("/list-all", response_class=HTMLResponse)
+async def list_all(
+    request: Request,
+    after: int | None = Query(None, ge=0),
+    availability: str | None = None,
+    min_price: str | None = None,
+    max_price: str | None = None,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=200),
+):
+    filters = {
+        "availability": availability if availability in ("Yes", "No") else None,
+        "min_price": parse_price(min_price),
+        "max_price": parse_price(max_price),
+    }
+    try:
+        version = await run_in_threadpool(get_catalogue_version)
     except Exception as e:
         return HTMLResponse(content=f"Error retrieving mangas: {e}", status_code=500)
-    finally:
-        close_connection(conn)
-    # Render the template with manga data
-    return templates.TemplateResponse(
-        "list_all.html", {"request": request, "mangas": mangas}
+
+    # The rendered page only changes when the catalogue version does
+    cache_key = (version, after, limit, *filters.values())
+    etag = '"' + hashlib.sha1(repr(cache_key).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    body = listing_cache.get(cache_key)
+    if body is None:
+        try:
+            mangas, next_after = await run_in_threadpool(list_mangas, after, limit, **filters)
+        except Exception as e:
+            return HTMLResponse(content=f"Error retrieving mangas: {e}", status_code=500)
+        page_params = {k: v for k, v in {**filters, "limit": limit}.items() if v is not None}
+        first_query = urlencode(page_params)
+        next_query = urlencode({**page_params, "after": next_after}) if next_after is not None else None
+        # Render the template with manga data
+        body = templates.get_template("list_all.html").render(
+            request=request, mangas=mangas, filters=filters,
+            first_query=first_query, next_query=next_query, is_first_page=after is None
+        )
+        listing_cache.put(cache_key, body)
+    return HTMLResponse(content=body, headers=headers)
+
+# Full-text search over titles and plots, optionally grouped by series
+@app.get("/api/search")
+async def api_search(
+    q: str = "",
+    page: int = Query(1, ge=1, le=1000),
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=200),
+    availability: str | None = None,
+    group: str | None = None,
+):
+    results, has_next = await run_in_threadpool(
+        search_mangas, q, page, limit, availability, group == "series"
     )
+    return {"query": q, "page": page, "results": results, "next_page": page + 1 if has_next else None}
+
+# Every volume of one series, in volume order
+@app.get("/api/series")
+async def api_series(name: str):
+    return {"series": name, "volumes": await run_in_threadpool(get_series, name)}
+
+@app.get("/search", response_class=HTMLResponse)
+async def search_page(
+    request: Request,
+    q: str = "",
+    page: int = Query(1, ge=1, le=1000),
+    availability: str | None = None,
+    group: str | None = None,
+    series: str | None = None,
+):
+    filters = {"q": q, "availability": availability if availability in ("Yes", "No") else None, "group": group}
+    try:
+        if series:
+            results, has_next = await run_in_threadpool(get_series, series), False
+        else:
+            results, has_next = await run_in_threadpool(
+                search_mangas, q, page, LIST_PAGE_SIZE, filters["availability"], group == "series"
+            )
+    except Exception as e:
+        return HTMLResponse(content=f"Error searching mangas: {e}", status_code=500)
+    page_params = {k: v for k, v in filters.items() if v}
+    return templates.TemplateResponse("search.html", {
+        "request": request,
+        "filters": filters,
+        "series": series,
+        "grouped": group == "series" and not series,
+        "results": results,
+        "page": page,
+        "prev_query": urlencode({**page_params, "page": page - 1}) if page > 1 else None,
+        "next_query": urlencode({**page_params, "page": page + 1}) if has_next else None,
+    })
+
+# Serve cover thumbnails generated from the stored cover blobs
+@app.get("/covers/{manga_id}")
+async def read_cover(request: Request, manga_id: int, size: str = "thumb"):
+    if size not in COVER_SIZES:
+        return Response(status_code=404)
+    data, remote_url = await run_in_threadpool(get_cover, manga_id, size)
+    if data is None:
+        if remote_url:
+            return RedirectResponse(remote_url)
+        return Response(status_code=404)
+
+    etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=604800"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/webp", headers=headers)
+
+# Price and availability history of one title, downsampled for charts
+@app.get("/manga/{manga_id}/history")
+async def read_manga_history(
+    manga_id: int,
+    start: int | None = None,
+    end: int | None = None,
+    buckets: int = Query(100, ge=1, le=1000),
+):
+    end = end or int(time.time())
+    start = start if start is not None else end - 90 * 86400
+    return await run_in_threadpool(get_manga_history, manga_id, start, end, buckets)
 
 # Define a status endpoint to verify the application is running
 @app.get("/status")
 def read_status():
     return {"status": "running", "app": "FastAPI Application", "version": "1.0"}
 
+# Define an endpoint reporting how long scraped pages took to become ready
+# (per worker process: only the scheduler leader scrapes)
+@app.get("/page-latency")
+def read_page_latency(response: Response):
+    response.headers["X-Scheduler-Leader"] = str(scheduler_lease.is_leader()).lower()
+    return get_page_latency_stats()
+
+# Define an endpoint reporting the scrape queue depth per state
+@app.get("/queue")
+def read_queue():
+    return get_queue_depth()
+
+# Define an endpoint reporting MySQL connection pool usage
+@app.get("/db-pool")
+def read_db_pool():
+    return get_db_pool_stats()
+
+
+# Define an endpoint reporting request spacing and circuit breaker state per scraped host
+# (per worker process: only the scheduler leader scrapes)
+@app.get("/hosts")
+def read_hosts(response: Response):
+    response.headers["X-Scheduler-Leader"] = str(scheduler_lease.is_leader()).lower()
+    return host_throttle.stats()
+
 
 # Define an endpoint to list all scheduled jobs
 @app.get("/jobs")
 def get_jobs():
     jobs = scheduler.get_jobs()
-    return [{"id": job.id, "next_run": job.next_run_time} for job in jobs]
+    return [
+        {
+            "id": job.id,
+            # Paused on the workers that don't hold the scheduler lease
+            "next_run": job.next_run_time,
+            "leader": scheduler_lease.is_leader(),
+            **job_tracker.last_run(job.func.__name__),
+        }
+        for job in jobs
+    ]
+
+# Prometheus metrics for the scrape pipeline and the web routes
+@app.get("/metrics")
+async def read_metrics():
+    try:
+        await run_in_threadpool(refresh_gauges)
+    except Exception as e:
+        logger.error(f"Unable to refresh metrics gauges: {e}")
+    return Response(content=generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
 
 
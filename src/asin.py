@@ -0,0 +1,101 @@
+from mysql.connector import Error
+from urllib.parse import parse_qs, urlsplit
+
+from .schema import index_exists
+
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Every submitted URL and scraped title is keyed by its Amazon ASIN
+ASIN_COLUMN = ("asin", "CHAR(10) NULL")
+ASIN_INDEXES = (("urls", "uq_urls_asin"), ("manga", "uq_manga_asin"))
+
+DEFAULT_HOST = "www.amazon.it"
+
+# Product links come in many shapes: /dp/, /gp/product/, mobile /gp/aw/d/,
+# legacy /exec/obidos/ASIN/ and /o/ASIN/, optionally behind a slug or locale
+_ASIN_PATH = re.compile(
+    r"/(?:dp|gp/product|gp/aw/d|exec/obidos/asin|exec/obidos/tg/detail/-|o/asin)/([A-Z0-9]{10})(?:[/?#]|$)",
+    re.IGNORECASE,
+)
+_ASIN = re.compile(r"^[A-Z0-9]{10}$", re.IGNORECASE)
+
+
+def canonical_asin(url):
+    """The ASIN of an Amazon product URL, upper-cased, or None if it has none."""
+    parts = urlsplit(url.strip())
+    match = _ASIN_PATH.search(parts.path + "/")
+    if match:
+        return match.group(1).upper()
+    for value in parse_qs(parts.query).get("asin", []):
+        if _ASIN.match(value):
+            return value.upper()
+    return None
+
+
+def canonical_url(url):
+    """Rewrite a product URL to `<scheme>://<host>/dp/<ASIN>`, dropping slugs and
+    tracking parameters. Returns `(asin, url)`, or `(None, None)` for URLs
+    without an ASIN."""
+    asin = canonical_asin(url)
+    if asin is None:
+        return None, None
+    parts = urlsplit(url.strip())
+    if not parts.netloc and "." in parts.path.split("/", 1)[0]:
+        # Scheme-less "www.amazon.de/dp/...": the host is the start of the path
+        parts = urlsplit("//" + url.strip())
+    host = (parts.netloc or DEFAULT_HOST).lower()
+    return asin, f"{parts.scheme.lower() or 'https'}://{host}/dp/{asin}"
+
+
+def migrate_asins(conn, batch_size=500):
+    """Backfill `asin` on `urls` and `manga`, drop duplicates and add the unique indexes.
+
+    Rows are canonicalised a batch at a time. For each ASIN the oldest row is
+    kept; newer duplicates are deleted, with the price history of the deleted
+    titles. Only runs while a unique index is missing, so it is a no-op once
+    the migration is done.
+    """
+    cursor = conn.cursor()
+    try:
+        for table, index in ASIN_INDEXES:
+            if index_exists(cursor, table, index):
+                continue
+            last_id = 0
+            while True:
+                cursor.execute(
+                    f"SELECT id, url FROM {table} WHERE asin IS NULL AND id > %s ORDER BY id LIMIT %s",
+                    (last_id, batch_size),
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                updates = []
+                for row_id, url in rows:
+                    asin, url = canonical_url(url or "")
+                    if asin:
+                        updates.append((asin, url, row_id))
+                if updates:
+                    cursor.executemany(f"UPDATE {table} SET asin = %s, url = %s WHERE id = %s", updates)
+                conn.commit()
+
+            if table == "manga":
+                cursor.execute(
+                    "DELETE h FROM manga_history h "
+                    "JOIN manga m ON h.manga_id = m.id "
+                    "JOIN manga k ON k.asin = m.asin AND k.id < m.id"
+                )
+            cursor.execute(f"DELETE t FROM {table} t JOIN {table} k ON k.asin = t.asin AND k.id < t.id")
+            removed = cursor.rowcount
+            cursor.execute(f"CREATE UNIQUE INDEX {index} ON {table} (asin)")
+            conn.commit()
+            logger.info(f"ASIN index {index} created, {removed} duplicate {table} rows removed")
+    except Error as e:
+        conn.rollback()
+        logger.error(f"ASIN migration failed: {e}")
+        raise
+    finally:
+        cursor.close()
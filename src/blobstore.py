@@ -0,0 +1,76 @@
+from mysql.connector import Error
+
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed store: identical images share one row keyed by SHA-256
+CREATE_COVER_BLOBS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS cover_blobs (
+        hash CHAR(64) PRIMARY KEY,
+        data LONGBLOB NOT NULL,
+        size INT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+'''
+
+
+def blob_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_blobs(cursor, blobs):
+    """Store each blob once and return their hashes, in order (None for empty blobs).
+
+    Runs inside the caller's transaction; already stored blobs are skipped.
+    """
+    hashes = [blob_hash(data) if data else None for data in blobs]
+    rows = {h: data for h, data in zip(hashes, blobs) if h is not None}
+    if rows:
+        cursor.executemany(
+            "INSERT IGNORE INTO cover_blobs (hash, data, size) VALUES (%s, %s, %s)",
+            [(h, data, len(data)) for h, data in rows.items()],
+        )
+    return hashes
+
+
+def load_blob(cursor, content_hash):
+    cursor.execute("SELECT data FROM cover_blobs WHERE hash = %s", (content_hash,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def migrate_cover_blobs(conn, batch_size=50):
+    """Move legacy `manga.cover_bin` blobs into `cover_blobs`, a batch at a time.
+
+    Each batch is one transaction: blobs are stored, the rows get their
+    `cover_hash` and `cover_bin` is cleared. Safe to re-run.
+    """
+    cursor = conn.cursor()
+    moved = 0
+    try:
+        while True:
+            cursor.execute(
+                "SELECT id, cover_bin FROM manga WHERE cover_bin IS NOT NULL LIMIT %s",
+                (batch_size,),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            hashes = store_blobs(cursor, [data for _, data in rows])
+            cursor.executemany(
+                "UPDATE manga SET cover_hash = %s, cover_bin = NULL WHERE id = %s",
+                [(h, manga_id) for (manga_id, _), h in zip(rows, hashes)],
+            )
+            conn.commit()
+            moved += len(rows)
+    except Error as e:
+        conn.rollback()
+        logger.error(f"Cover blob migration stopped after {moved} rows: {e}")
+        raise
+    finally:
+        cursor.close()
+    if moved:
+        logger.info(f"Moved {moved} cover blobs into cover_blobs")
+    return moved
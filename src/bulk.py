@@ -0,0 +1,191 @@
+from decimal import Decimal
+
+import codecs
+import csv
+import io
+import json
+
+# Bulk watchlist formats, by request Content-Type and by ?format=
+IMPORT_CONTENT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+    "text/plain": "text",
+}
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+EXPORT_COLUMNS = ("asin", "url", "title", "price", "availability", "rating", "cover")
+
+MAX_URL_LENGTH = 2048
+# A line or JSON value longer than this is rejected instead of buffered
+MAX_ENTRY_BYTES = 64 * 1024
+
+
+class BulkFormatError(ValueError):
+    """The import body is not in the announced format."""
+
+
+def import_format(content_type, requested=None):
+    """The import format named by `?format=`, else by the Content-Type header."""
+    if requested:
+        if requested not in IMPORT_CONTENT_TYPES.values():
+            raise BulkFormatError(f"Unknown import format {requested!r}")
+        return requested
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in IMPORT_CONTENT_TYPES:
+        raise BulkFormatError(f"Unsupported Content-Type {media_type or 'none'!r}, pass ?format=")
+    return IMPORT_CONTENT_TYPES[media_type]
+
+
+def _url(value):
+    """The URL of one import entry: a string or an object with a `url` key; None when invalid."""
+    if isinstance(value, dict):
+        value = value.get("url")
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if not value or len(value) > MAX_URL_LENGTH:
+        return None
+    return value
+
+
+class ImportParser:
+    """Incremental parser for bulk import bodies.
+
+    `feed(chunk)` takes the body a chunk at a time and returns the URLs of the
+    entries completed so far, None for entries that are not a usable URL;
+    `close()` returns the last ones. Only the unfinished entry is buffered, so
+    memory does not grow with the body.
+
+    - text: one URL per line, blank lines and `#` comments ignored.
+    - ndjson: one JSON string or `{"url": ...}` object per line.
+    - csv: the `url` column when the first row is a header, else the first column.
+    - json: an array of strings or `{"url": ...}` objects.
+    """
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+        self.entries = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._buffer = ""
+        self._csv_column = None
+        # json: before "[", inside the array, after "]"
+        self._json_state = "start"
+
+    def feed(self, chunk):
+        self._buffer += self._decoder.decode(chunk)
+        return self._parse(final=False)
+
+    def close(self):
+        self._buffer += self._decoder.decode(b"", final=True)
+        urls = self._parse(final=True)
+        if self.fmt == "json" and self._json_state != "end":
+            raise BulkFormatError("JSON body is not a complete array")
+        return urls
+
+    def _parse(self, final):
+        if self.fmt == "json":
+            return self._parse_json(final)
+        lines = self._buffer.split("\n")
+        self._buffer = "" if final else lines.pop()
+        if len(self._buffer) > MAX_ENTRY_BYTES:
+            raise BulkFormatError(f"Line {self.entries + 1} is longer than {MAX_ENTRY_BYTES} bytes")
+        urls = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if self.fmt == "text":
+                if line.startswith("#"):
+                    continue
+                url = _url(line)
+            elif self.fmt == "ndjson":
+                try:
+                    url = _url(json.loads(line))
+                except ValueError:
+                    url = None
+            else:
+                row = next(csv.reader([line]), [])
+                if self._csv_column is None:
+                    header = [cell.strip().lower() for cell in row]
+                    if "url" in header:
+                        self._csv_column = header.index("url")
+                        continue
+                    self._csv_column = 0
+                url = _url(row[self._csv_column]) if len(row) > self._csv_column else None
+            self.entries += 1
+            urls.append(url)
+        return urls
+
+    def _parse_json(self, final):
+        decoder = json.JSONDecoder()
+        buffer = self._buffer
+        position = 0
+        urls = []
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or
+                                              (buffer[position] == "," and self._json_state == "array")):
+                position += 1
+            if position == len(buffer):
+                break
+            if self._json_state == "start":
+                if buffer[position] != "[":
+                    raise BulkFormatError("JSON body must be an array of URLs")
+                self._json_state = "array"
+                position += 1
+            elif self._json_state == "end":
+                raise BulkFormatError("Unexpected data after the JSON array")
+            elif buffer[position] == "]":
+                self._json_state = "end"
+                position += 1
+            else:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    # Most likely an entry split across chunks: wait for the rest
+                    if final or len(buffer) - position > MAX_ENTRY_BYTES:
+                        raise BulkFormatError(f"Invalid JSON at entry {self.entries + 1}")
+                    break
+                # A number or literal ending the chunk may continue in the next one
+                if end == len(buffer) and not final and not isinstance(value, (str, dict, list)):
+                    break
+                position = end
+                self.entries += 1
+                urls.append(_url(value))
+        self._buffer = buffer[position:]
+        return urls
+
+
+def _json_value(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def encode_export(chunks, fmt):
+    """Encode catalogue rows, given as lists of dicts, in `fmt`; yields one string per chunk."""
+    first = True
+    if fmt == "json":
+        yield "["
+    elif fmt == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\r\n"
+    for rows in chunks:
+        if fmt == "csv":
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerows([[row[column] for column in EXPORT_COLUMNS] for row in rows])
+            yield out.getvalue()
+            continue
+        lines = [
+            json.dumps({column: _json_value(row[column]) for column in EXPORT_COLUMNS}, ensure_ascii=False)
+            for row in rows
+        ]
+        if fmt == "ndjson":
+            yield "".join(line + "\n" for line in lines)
+        elif lines:
+            yield ("\n" if first else ",\n") + ",\n".join(lines)
+            first = False
+    if fmt == "json":
+        yield "\n]\n"
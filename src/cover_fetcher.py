@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from .blobstore import blob_hash, store_blobs
+from .logging_setup import log_context
+from .metrics import COVER_DOWNLOADS, timed
+
+import threading
+import time
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Validators and content of every cover URL fetched so far
+CREATE_COVER_SOURCES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS cover_sources (
+        url_hash CHAR(64) PRIMARY KEY,
+        url TEXT NOT NULL,
+        etag VARCHAR(255) NULL,
+        last_modified VARCHAR(64) NULL,
+        content_hash CHAR(64) NULL,
+        fetched_at DOUBLE NOT NULL,
+        failures INT NOT NULL DEFAULT 0,
+        retry_after DOUBLE NULL
+    );
+'''
+
+# Consecutive download failures of a cover URL, and when to try it again
+COVER_RETRY_COLUMNS = (("failures", "INT NOT NULL DEFAULT 0"), ("retry_after", "DOUBLE NULL"))
+
+
+class CoverTooLarge(Exception):
+    pass
+
+
+class CoverFetcher:
+    """Concurrent cover download stage, decoupled from page scraping.
+
+    Covers are fetched on a bounded thread pool through a pooled session with
+    timeouts and a size cap. A URL fetched less than `refresh_seconds` ago is
+    not requested again; older ones are revalidated with If-None-Match /
+    If-Modified-Since. Downloaded bytes go to the content-addressed blob store
+    and the requesting manga rows get the blob hash. A failed download sets
+    the URL's `retry_after`, `retry_seconds` doubled on every consecutive
+    failure up to `max_retry_seconds`.
+    """
+
+    def __init__(self, get_connection, release_connection, concurrency=4, timeout=15,
+                 max_bytes=5 * 1024 * 1024, refresh_seconds=30 * 86400, retry_seconds=3600,
+                 max_retry_seconds=7 * 86400):
+        self.get_connection = get_connection
+        self.release_connection = release_connection
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="cover-fetch")
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def submit(self, targets):
+        """Schedule covers for `(manga_id, cover_url)` pairs; returns immediately.
+
+        Several volumes sharing a cover URL trigger a single download.
+        """
+        by_url = {}
+        for manga_id, url in targets:
+            if url:
+                by_url.setdefault(url, []).append(manga_id)
+        futures = []
+        with self._lock:
+            for url, manga_ids in by_url.items():
+                if url in self._pending:
+                    # Already in flight: just add the rows to update
+                    self._pending[url].extend(manga_ids)
+                    continue
+                self._pending[url] = list(manga_ids)
+                futures.append(self.executor.submit(self._run, url))
+        return futures
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, url):
+        try:
+            with log_context(url=url), timed("image_download"):
+                content_hash = self.fetch(url)
+        except Exception as e:
+            content_hash = None
+            COVER_DOWNLOADS.labels(outcome="error").inc()
+            logger.error(f"Failed to download image {url}: {e}")
+            self._record_failure(url)
+        with self._lock:
+            manga_ids = self._pending.pop(url, [])
+        if content_hash and manga_ids:
+            try:
+                self._assign(content_hash, manga_ids)
+            except Exception as e:
+                # Nobody waits on these futures: log here or lose the error
+                COVER_DOWNLOADS.labels(outcome="error").inc()
+                logger.error(f"Failed to store the cover of manga IDs {manga_ids} from {url}: {e}")
+        return content_hash
+
+    def fetch(self, url):
+        """Return the blob hash for `url`, downloading it only when needed."""
+        url_hash = blob_hash(url.encode())
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT etag, last_modified, content_hash, fetched_at FROM cover_sources WHERE url_hash = %s",
+                (url_hash,),
+            )
+            known = cursor.fetchone()
+            conn.commit()
+        finally:
+            self.release_connection(conn)
+
+        headers = {}
+        if known:
+            etag, last_modified, content_hash, fetched_at = known
+            if content_hash and time.time() - fetched_at < self.refresh_seconds:
+                COVER_DOWNLOADS.labels(outcome="fresh").inc()
+                return content_hash
+            if content_hash and etag:
+                headers["If-None-Match"] = etag
+            if content_hash and last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and known:
+                COVER_DOWNLOADS.labels(outcome="not_modified").inc()
+                self._save_source(url_hash, url, known[0], known[1], known[2], None)
+                return known[2]
+            response.raise_for_status()
+            data = self._read_capped(response)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        COVER_DOWNLOADS.labels(outcome="downloaded").inc()
+        logger.debug(f"Image: {url} successfully downloaded!")
+        return self._save_source(url_hash, url, etag, last_modified, None, data)
+
+    def _read_capped(self, response):
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            raise CoverTooLarge(f"{length} bytes exceeds the {self.max_bytes} byte cap")
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise CoverTooLarge(f"more than {self.max_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _save_source(self, url_hash, url, etag, last_modified, content_hash, data):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if data is not None:
+                content_hash = store_blobs(cursor, [data])[0]
+            cursor.execute(
+                "INSERT INTO cover_sources (url_hash, url, etag, last_modified, content_hash, fetched_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE etag = VALUES(etag), last_modified = VALUES(last_modified), "
+                "content_hash = VALUES(content_hash), fetched_at = VALUES(fetched_at), "
+                "failures = 0, retry_after = NULL",
+                (url_hash, url, etag, last_modified, content_hash, time.time()),
+            )
+            conn.commit()
+        finally:
+            self.release_connection(conn)
+        return content_hash
+
+    def _record_failure(self, url):
+        now = time.time()
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            # Assignments apply in order: the backoff uses the incremented count
+            cursor.execute(
+                "INSERT INTO cover_sources (url_hash, url, fetched_at, failures, retry_after) "
+                "VALUES (%s, %s, %s, 1, %s) "
+                "ON DUPLICATE KEY UPDATE failures = failures + 1, "
+                "retry_after = %s + LEAST(%s, %s * POW(2, failures - 1))",
+                (blob_hash(url.encode()), url, now, now + min(self.retry_seconds, self.max_retry_seconds),
+                 now, self.max_retry_seconds, self.retry_seconds),
+            )
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Unable to record the failed download of {url}: {e}")
+        finally:
+            if conn is not None:
+                self.release_connection(conn)
+
+    def _assign(self, content_hash, manga_ids):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            placeholders = ", ".join(["%s"] * len(manga_ids))
+            cursor.execute(
+                f"UPDATE manga SET cover_hash = %s WHERE id IN ({placeholders})",
+                (content_hash, *manga_ids),
+            )
+            conn.commit()
+        finally:
+            self.release_connection(conn)
@@ -0,0 +1,91 @@
+from PIL import Image
+
+import io
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_sizes(spec):
+    # "thumb:200,medium:400" -> {"thumb": 200, "medium": 400}
+    sizes = {}
+    for item in spec.split(","):
+        name, _, width = item.strip().partition(":")
+        if name and width.isdigit():
+            sizes[name] = int(width)
+    return sizes
+
+
+def render_thumbnail(data, width, image_format="WEBP", quality=80):
+    """Resize cover bytes to `width` pixels wide, keeping the aspect ratio."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, format=image_format, quality=quality, method=4)
+        return out.getvalue()
+
+
+class DiskLRUCache:
+    """Size-capped on-disk cache, evicting the least recently used files.
+
+    Recency is tracked through each file's mtime, bumped on every hit, so the
+    cache survives restarts without a separate index.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            try:
+                self._total -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".tmp")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        # Evict down to 90% of the cap so every put doesn't rescan the directory
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total -= size
+            except FileNotFoundError:
+                pass
+        logger.info(f"Cover cache evicted down to {self._total} bytes")
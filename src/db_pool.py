@@ -0,0 +1,100 @@
+from mysql.connector import pooling
+from mysql.connector.errors import Error, PoolError
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Process-wide MySQL connection pool shared by the routes and the jobs.
+
+    The underlying pool is created on first use. Every checkout is pre-pinged
+    by mysql-connector (`is_connected()`) and transparently reconnected when the
+    server dropped it. Callers wait up to `timeout` seconds for a free
+    connection before a `PoolError` is raised.
+    """
+
+    def __init__(self, config, size=10, timeout=10, name="mangas", retries=5, retry_delay=5):
+        self.config = config
+        # mysql-connector refuses pools larger than 32 connections
+        self.size = max(1, min(int(size), pooling.CNX_POOL_MAXSIZE))
+        self.timeout = timeout
+        self.name = name
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._pool = None
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._acquired = 0
+        self._waited = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+
+    def _get_pool(self):
+        with self._init_lock:
+            if self._pool is not None:
+                return self._pool
+            for attempt in range(1, self.retries + 1):
+                try:
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name=self.name,
+                        pool_size=self.size,
+                        pool_reset_session=True,
+                        **self.config
+                    )
+                    logger.info(f"MySQL pool '{self.name}' ready with {self.size} connections")
+                    return self._pool
+                except Error as e:
+                    logger.error(f"Failed to create MySQL pool (attempt {attempt}/{self.retries}): {e}")
+                    if attempt < self.retries:
+                        time.sleep(self.retry_delay)
+            raise PoolError(f"Unable to create MySQL pool '{self.name}' after {self.retries} attempts")
+
+    def acquire(self):
+        pool = self._get_pool()
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self._timeouts += 1
+            raise PoolError(f"No MySQL connection free after {self.timeout}s (pool size {self.size})")
+        waited = time.monotonic() - start
+        try:
+            conn = pool.get_connection()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._stats_lock:
+            self._acquired += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._wait_total += waited
+            if waited > 0.001:
+                self._waited += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "acquired": self._acquired,
+                "waited": self._waited,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": round(1000 * self._wait_total / self._acquired, 3) if self._acquired else 0.0,
+                "acquire_timeout": self.timeout,
+            }
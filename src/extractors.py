@@ -0,0 +1,203 @@
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
+
+from requests.adapters import HTTPAdapter
+from selenium.webdriver.remote.webdriver import WebDriver
+
+import hashlib
+import json
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+TITLE_SELECTOR = "#productTitle"
+OUT_OF_STOCK_SELECTOR = "#outOfStock"
+PRICE_SELECTOR = ".a-section.a-spacing-none.aok-align-center.aok-relative span.aok-offscreen"
+RATING_SELECTOR = "#acrPopover"
+TRAMA_SELECTOR = "#bookDescription_feature_div span"
+COVER_SELECTOR = "#landingImage"
+
+# Fields returned by every backend, None when missing from the page
+PRODUCT_FIELDS = ("title", "out_of_stock", "price", "rating", "trama", "cover")
+# A page without these is not a usable product page
+REQUIRED_FIELDS = ("title",)
+# Fields an availability check reacts to; unchanged ones mean nothing to do
+FINGERPRINT_FIELDS = ("price", "out_of_stock", "rating")
+
+# Per-title change detection state stored on the `manga` row
+FINGERPRINT_COLUMNS = (
+    ("fingerprint", "CHAR(16) NULL"),
+    # Validators of the last product page fetched over HTTP
+    ("page_etag", "VARCHAR(255) NULL"),
+    ("page_last_modified", "VARCHAR(64) NULL"),
+)
+
+# Robot-check and throttling answers: a captcha form, or these status codes
+CAPTCHA_SELECTOR = "form[action*='validateCaptcha']"
+BLOCK_STATUS_CODES = (429, 503)
+BLOCK_MARKERS = (
+    "/errors/validateCaptcha",
+    "api-services-support@amazon.com",
+    "Type the characters you see in this image",
+    "Inserisci i caratteri visualizzati",
+)
+
+
+class BlockedError(Exception):
+    """The site answered with a captcha or a throttling page instead of the product."""
+
+
+def is_blocked_page(page_source):
+    # Block pages are tiny; only look at the head of real product pages
+    head = (page_source or "")[:20000]
+    return any(marker in head for marker in BLOCK_MARKERS)
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64; rv:133.0) Gecko/20100101 Firefox/133.0"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "it-IT,it;q=0.9,en;q=0.5",
+}
+
+# Selenium backend: every field read in one script, with the same rules as parse_product
+EXTRACT_SCRIPT = f"""
+const one = (selector) => document.querySelector(selector);
+const text = (element) => {{
+    if (!element) return null;
+    const value = (element.innerText || element.textContent || "").split(/\\s+/).filter(Boolean).join(" ");
+    return value || null;
+}};
+const price = one({json.dumps(PRICE_SELECTOR)});
+const popover = one({json.dumps(RATING_SELECTOR)});
+let rating = text(one({json.dumps(RATING_SELECTOR + " span.a-size-base")}));
+if (!rating && popover) {{
+    rating = (popover.getAttribute("title") || "").split(" ")[0] || text(popover);
+}}
+const cover = one({json.dumps(COVER_SELECTOR)});
+return {{
+    blocked: one({json.dumps(CAPTCHA_SELECTOR)}) !== null,
+    title: text(one({json.dumps(TITLE_SELECTOR)})),
+    out_of_stock: one({json.dumps(OUT_OF_STOCK_SELECTOR)}) !== null,
+    price: price ? price.textContent : null,
+    rating: rating,
+    trama: text(one({json.dumps(TRAMA_SELECTOR)})),
+    cover: cover ? cover.src || null : null,
+}};
+"""
+
+# Selectors are compiled once to XPath and reused for every page
+_title = CSSSelector(TITLE_SELECTOR)
+_out_of_stock = CSSSelector(OUT_OF_STOCK_SELECTOR)
+_price = CSSSelector(PRICE_SELECTOR)
+_rating = CSSSelector(RATING_SELECTOR)
+_rating_value = CSSSelector(f"{RATING_SELECTOR} span.a-size-base")
+_trama = CSSSelector(TRAMA_SELECTOR)
+_cover = CSSSelector(COVER_SELECTOR)
+
+
+def _text(element):
+    text = " ".join(element.text_content().split())
+    return text or None
+
+
+def is_complete(product, required=REQUIRED_FIELDS):
+    return product is not None and all(product.get(field) for field in required)
+
+
+def product_fingerprint(product):
+    """Short hash of the price, stock and rating blocks of an extracted product."""
+    material = "\x1f".join(str(product.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.blake2b(material.encode(), digest_size=8).hexdigest()
+
+
+def parse_product(page_source):
+    """Extract the product fields from server-rendered product page HTML."""
+    tree = lxml_html.fromstring(page_source)
+
+    title = _title(tree)
+    price = _price(tree)
+    trama = _trama(tree)
+    cover = _cover(tree)
+
+    rating = None
+    rating_value = _rating_value(tree)
+    if rating_value:
+        rating = _text(rating_value[0])
+    else:
+        popover = _rating(tree)
+        if popover:
+            # e.g. title="4,8 su 5 stelle"
+            rating = (popover[0].get("title") or "").split(" ")[0] or _text(popover[0])
+
+    return {
+        "title": _text(title[0]) if title else None,
+        "out_of_stock": bool(_out_of_stock(tree)),
+        # Selenium reads textContent for the price, keep the raw text
+        "price": price[0].text_content() if price else None,
+        "rating": rating,
+        "trama": _text(trama[0]) if trama else None,
+        "cover": cover[0].get("src") if cover else None,
+    }
+
+
+class HttpExtractor:
+    """Browser-free backend: pooled HTTP fetch + compiled-selector parsing."""
+
+    def __init__(self, pool_size=10, timeout=15, headers=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @staticmethod
+    def _check_blocked(url, response):
+        if response.status_code in BLOCK_STATUS_CODES or is_blocked_page(response.text):
+            raise BlockedError(f"Blocked by {url} (HTTP {response.status_code})")
+
+    def fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        self._check_blocked(url, response)
+        response.raise_for_status()
+        return response.text
+
+    def fetch_conditional(self, url, etag=None, last_modified=None):
+        """Fetch `url` unless it is unchanged since the given validators.
+
+        Returns `(page_source, etag, last_modified)`; `page_source` is None
+        when the server answered 304 Not Modified.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and headers:
+            return None, etag, last_modified
+        self._check_blocked(url, response)
+        response.raise_for_status()
+        return response.text, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+    def extract(self, url):
+        return parse_product(self.fetch(url))
+
+
+def extract_with_driver(driver: WebDriver):
+    """Selenium backend: read the product fields from the page loaded in `driver`.
+
+    All fields come back from a single script run in the page, so a page
+    costs one WebDriver round-trip and missing elements never hit the
+    implicit wait. Raises `BlockedError` on a captcha page.
+    """
+    fields = driver.execute_script(EXTRACT_SCRIPT) or {}
+    if fields.get("blocked"):
+        raise BlockedError(f"Captcha page at {driver.current_url}")
+    product = dict.fromkeys(PRODUCT_FIELDS)
+    product.update((field, fields.get(field)) for field in PRODUCT_FIELDS)
+    product["out_of_stock"] = bool(product["out_of_stock"])
+    return product
@@ -0,0 +1,86 @@
+import math
+
+# Append-only price/availability observations, one row per change only
+CREATE_HISTORY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS manga_history (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        manga_id INT NOT NULL,
+        observed_at INT UNSIGNED NOT NULL,
+        price DECIMAL(10, 2) NULL,
+        available TINYINT(1) NOT NULL,
+        KEY idx_history_manga_time (manga_id, observed_at)
+    );
+'''
+
+
+def record_change(cursor, manga_id, observed_at, price, available):
+    """Append one observation; runs inside the caller's transaction."""
+    cursor.execute(
+        "INSERT INTO manga_history (manga_id, observed_at, price, available) VALUES (%s, %s, %s, %s)",
+        (manga_id, int(observed_at), price, 1 if available else 0),
+    )
+
+
+def record_initial(cursor, manga_ids, observed_at):
+    """Seed history with the current price and availability of newly inserted titles."""
+    if not manga_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(manga_ids))
+    cursor.execute(
+        "INSERT INTO manga_history (manga_id, observed_at, price, available) "
+        f"SELECT id, %s, price, availability = 'Yes' FROM manga WHERE id IN ({placeholders})",
+        (int(observed_at), *manga_ids),
+    )
+
+
+def get_history(cursor, manga_id, start, end, buckets=100):
+    """Downsample the observations of one title between `start` and `end`.
+
+    Returns one point per time bucket that saw a change, with the min, max
+    and last price and whether the title was available at the end of it. The
+    state in effect at `start` comes first, so the series can be drawn as a
+    step chart over the whole range.
+    """
+    bucket = max(1, math.ceil((end - start) / max(1, buckets)))
+    points = []
+
+    cursor.execute(
+        "SELECT observed_at, price, available FROM manga_history "
+        "WHERE manga_id = %s AND observed_at < %s ORDER BY observed_at DESC LIMIT 1",
+        (manga_id, start),
+    )
+    previous = cursor.fetchone()
+    if previous:
+        price = float(previous[1]) if previous[1] is not None else None
+        points.append({"time": start, "min": price, "max": price, "last": price, "available": bool(previous[2])})
+
+    cursor.execute(
+        '''
+        SELECT FLOOR(observed_at / %s) * %s AS bucket_start,
+               MIN(price), MAX(price),
+               CAST(SUBSTRING_INDEX(GROUP_CONCAT(price ORDER BY observed_at DESC), ',', 1) AS DECIMAL(10, 2)),
+               CAST(SUBSTRING_INDEX(GROUP_CONCAT(available ORDER BY observed_at DESC), ',', 1) AS UNSIGNED)
+        FROM manga_history
+        WHERE manga_id = %s AND observed_at >= %s AND observed_at <= %s
+        GROUP BY bucket_start
+        ORDER BY bucket_start
+        ''',
+        (bucket, bucket, manga_id, start, end),
+    )
+    for bucket_start, low, high, last, available in cursor.fetchall():
+        points.append({
+            "time": int(bucket_start),
+            "min": float(low) if low is not None else None,
+            "max": float(high) if high is not None else None,
+            "last": float(last) if last is not None else None,
+            "available": bool(available),
+        })
+    return {"manga_id": manga_id, "start": start, "end": end, "bucket_seconds": bucket, "points": points}
+
+
+def price_drop(old_price, new_price, threshold_pct):
+    """Percent drop from `old_price` to `new_price` when it reaches the threshold, else None."""
+    if not old_price or new_price is None or new_price >= old_price:
+        return None
+    drop = 100 * (old_price - new_price) / old_price
+    return drop if drop >= threshold_pct else None
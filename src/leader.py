@@ -0,0 +1,134 @@
+from mysql.connector import Error
+
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One row per lease; whoever holds an unexpired row is the leader
+CREATE_LEASES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS leader_leases (
+        name VARCHAR(64) PRIMARY KEY,
+        holder VARCHAR(128) NOT NULL,
+        lease_until DOUBLE NOT NULL,
+        acquired_at DOUBLE NOT NULL
+    );
+'''
+
+
+class LeaderLease:
+    """Database lease electing one process, among all workers and replicas, as leader.
+
+    A heartbeat thread takes the lease when it is free or expired and renews it
+    every `heartbeat` seconds while held; it lapses `ttl` seconds after the last
+    renewal, so a crashed leader is replaced within `ttl`. `on_elected` and
+    `on_revoked` are called from the heartbeat thread when leadership changes.
+    """
+
+    def __init__(self, get_connection, release_connection, name="scheduler", ttl=60, heartbeat=15,
+                 on_elected=None, on_revoked=None):
+        if heartbeat >= ttl:
+            raise ValueError("The lease heartbeat must be shorter than its ttl")
+        self.get_connection = get_connection
+        self.release_connection = release_connection
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.on_elected = on_elected
+        self.on_revoked = on_revoked
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._valid_until = 0.0
+        self._leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_leader(self):
+        # Trust the lease only until it would have lapsed on the database side
+        return self._leader and time.monotonic() < self._valid_until
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-lease", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._leader:
+            self._set_leader(False)
+            self._release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._set_leader(self._renew())
+            self._stop.wait(self.heartbeat)
+
+    def _set_leader(self, leader):
+        if leader == self._leader:
+            return
+        self._leader = leader
+        logger.info(f"{self.holder} {'acquired' if leader else 'lost'} the {self.name} lease")
+        callback = self.on_elected if leader else self.on_revoked
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Lease callback failed: {e}")
+
+    def _renew(self):
+        """Take or extend the lease in one statement; returns whether we hold it."""
+        started = time.monotonic()
+        now = time.time()
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            # Insert when missing, otherwise only overwrite our own or an expired lease
+            cursor.execute(
+                "INSERT INTO leader_leases (name, holder, lease_until, acquired_at) VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE "
+                "acquired_at = IF(holder = VALUES(holder) OR lease_until >= %s, acquired_at, VALUES(acquired_at)), "
+                "lease_until = IF(holder = VALUES(holder) OR lease_until < %s, VALUES(lease_until), lease_until), "
+                # Assignments apply in order: lease_until only matches when it was taken above
+                "holder = IF(lease_until = VALUES(lease_until), VALUES(holder), holder)",
+                (self.name, self.holder, now + self.ttl, now, now, now),
+            )
+            cursor.execute("SELECT holder FROM leader_leases WHERE name = %s", (self.name,))
+            (holder,) = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+        except Error as e:
+            logger.warning(f"Could not renew the {self.name} lease: {e}")
+            # Keep leading until the lease we already hold runs out
+            return self.is_leader()
+        finally:
+            if conn is not None:
+                self.release_connection(conn)
+        if holder == self.holder:
+            self._valid_until = started + self.ttl
+            return True
+        return False
+
+    def _release(self):
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            # Let a standby take over at its next heartbeat instead of after the ttl
+            cursor.execute(
+                "UPDATE leader_leases SET lease_until = 0 WHERE name = %s AND holder = %s",
+                (self.name, self.holder),
+            )
+            conn.commit()
+            cursor.close()
+        except Error as e:
+            logger.warning(f"Could not release the {self.name} lease: {e}")
+        finally:
+            if conn is not None:
+                self.release_connection(conn)
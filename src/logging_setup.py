@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+
+# Fields attached to every record logged inside a `log_context` block
+_context = contextvars.ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+@contextmanager
+def log_context(**fields):
+    """Add `fields` (job, url, manga_id, ...) to the records logged in this block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind_context(fn):
+    """Wrap `fn` so it runs with the current log context, e.g. in a worker thread."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the context and `extra=` fields at the top level."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ContextQueueHandler(QueueHandler):
+    """Enqueue records without formatting them; only the listener thread does I/O."""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec):
+    """Parse `"src.utils=WARNING,apscheduler=ERROR"` into `{logger: level}`."""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(path, level="INFO", module_levels="", max_bytes=10 * 1024 * 1024, backup_count=5,
+                  fmt="json", console=False):
+    """Route all logging through a queue to a size-rotated file.
+
+    Callers only pay for putting the record on a queue; formatting and writes
+    happen on the listener thread. Returns the started `QueueListener`, to be
+    stopped on shutdown so buffered records are flushed.
+
+    Size rotation is only safe in a single process. With `max_bytes=0` the
+    file is only appended to and reopened once an external tool (logrotate)
+    has moved it, so several workers can share it. A `path` of "-" logs to
+    stderr only.
+    """
+
+    if fmt == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    handlers = []
+    if path != "-":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if max_bytes > 0:
+            file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        else:
+            file_handler = WatchedFileHandler(path, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console or path == "-":
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _ContextQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,157 @@
+from contextlib import contextmanager
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+
+import os
+import threading
+import time
+
+# Set under `uvicorn --workers N` so /metrics aggregates every worker process
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Per-stage latency of the scrape pipeline
+STAGE_SECONDS = Histogram(
+    "manga_scrape_stage_seconds",
+    "Time spent per scrape pipeline stage",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+PAGES = Counter(
+    "manga_scrape_pages_total",
+    "Product pages processed, by job and outcome",
+    ["job", "outcome"],
+)
+FAILURES = Counter(
+    "manga_scrape_failures_total",
+    "Scrape pipeline failures, by stage",
+    ["stage"],
+)
+COVER_DOWNLOADS = Counter(
+    "manga_cover_downloads_total",
+    "Cover fetches, by outcome (downloaded, not_modified, fresh, error)",
+    ["outcome"],
+)
+AVAILABILITY_CHECKS = Counter(
+    "manga_availability_checks_total",
+    "Availability checks, by result (not_modified, unchanged, changed)",
+    ["result"],
+)
+DB_ACQUIRE_SECONDS = Histogram(
+    "manga_db_acquire_seconds",
+    "Time waiting for a pooled MySQL connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "manga_http_request_seconds",
+    "FastAPI request latency, by route and status",
+    ["method", "route", "status"],
+)
+JOB_RUNS = Counter(
+    "manga_job_runs_total",
+    "Scheduled job runs, by job and outcome",
+    ["job", "outcome"],
+)
+JOB_LAST_DURATION = Gauge(
+    "manga_job_last_duration_seconds",
+    "Duration of the last run of each scheduled job",
+    ["job"],
+    multiprocess_mode="mostrecent",
+)
+QUEUE_DEPTH = Gauge(
+    "manga_queue_depth",
+    "URL queue items, by status",
+    ["status"],
+    multiprocess_mode="livemostrecent",
+)
+DB_POOL = Gauge(
+    "manga_db_pool_connections",
+    "MySQL pool connections, by state",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+HOST_INTERVAL = Gauge(
+    "manga_host_request_interval_seconds",
+    "Current adaptive spacing between two requests to a host",
+    ["host"],
+    multiprocess_mode="livemax",
+)
+HOST_CIRCUIT_OPEN = Gauge(
+    "manga_host_circuit_open",
+    "1 while a host's circuit breaker is open or half-open",
+    ["host"],
+    multiprocess_mode="livemax",
+)
+
+
+def metrics_registry():
+    """The registry to expose: every worker's samples in multiprocess mode, else this process's."""
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def mark_process_dead():
+    """Drop this process's live gauges from the multiprocess aggregate on shutdown."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+@contextmanager
+def timed(stage):
+    """Observe the duration of a stage; failures are counted and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        FAILURES.labels(stage=stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+class _Run:
+    def __init__(self):
+        self.outcome = "success"
+        self.error = None
+
+    def fail(self, error):
+        self.outcome = "error"
+        self.error = str(error)
+
+
+class JobTracker:
+    """Keeps the last run time, duration and outcome of each job."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = {}
+
+    @contextmanager
+    def track(self, job):
+        run = _Run()
+        started = time.time()
+        try:
+            yield run
+        except Exception as e:
+            run.fail(e)
+            raise
+        finally:
+            duration = time.time() - started
+            JOB_RUNS.labels(job=job, outcome=run.outcome).inc()
+            JOB_LAST_DURATION.labels(job=job).set(duration)
+            with self._lock:
+                self._last[job] = {
+                    "last_run": started,
+                    "last_duration": round(duration, 3),
+                    "last_outcome": run.outcome,
+                    "last_error": run.error,
+                }
+
+    def last_run(self, job):
+        with self._lock:
+            return dict(self._last.get(job, {}))
+
+
+job_tracker = JobTracker()
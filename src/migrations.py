@@ -0,0 +1,192 @@
+from mysql.connector import Error
+
+from .asin import ASIN_COLUMN, migrate_asins
+from .blobstore import migrate_cover_blobs
+from .cover_fetcher import COVER_RETRY_COLUMNS
+from .extractors import FINGERPRINT_COLUMNS
+from .schema import add_column_if_missing, add_index_if_missing, column_exists, index_exists
+from .scheduling import CHECK_FAILURES_COLUMN, SCHEDULING_COLUMNS
+from .search import FULLTEXT_INDEX, SERIES_COLUMNS, backfill_series
+from .work_queue import QUEUE_COLUMNS, WorkQueue
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Applied schema versions, one row per migration
+CREATE_MIGRATIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        applied_at DOUBLE NOT NULL
+    );
+'''
+
+# Serialises migrations when several app instances start together
+MIGRATION_LOCK = "manga_schema_migrations"
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register `fn(conn)` as schema version `version`; versions apply in order, once."""
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return fn
+    return register
+
+
+
+# Runs first on new databases; on older ones the columns are already there
+@migration(0, "cover hash, queue, scheduling, fingerprint and ASIN columns")
+def _base_columns(conn):
+    cursor = conn.cursor()
+    # Covers live in cover_blobs, the manga row only keeps their hash
+    add_column_if_missing(cursor, "manga", "cover_hash", "CHAR(64) NULL")
+    # `urls` doubles as the durable scrape queue
+    for column, definition in QUEUE_COLUMNS:
+        add_column_if_missing(cursor, "urls", column, definition)
+    WorkQueue(table="urls").create_index(cursor)
+    # Adaptive availability scheduling state
+    for column, definition in SCHEDULING_COLUMNS + FINGERPRINT_COLUMNS:
+        add_column_if_missing(cursor, "manga", column, definition)
+    add_index_if_missing(cursor, "manga", "idx_manga_next_check", "next_check_at")
+    # URLs and titles are keyed by ASIN
+    add_column_if_missing(cursor, "urls", *ASIN_COLUMN)
+    add_column_if_missing(cursor, "manga", *ASIN_COLUMN)
+    cursor.close()
+
+
+@migration(1, "move cover blobs out of manga")
+def _cover_blobs(conn):
+    cursor = conn.cursor()
+    if column_exists(cursor, "manga", "cover_bin"):
+        migrate_cover_blobs(conn)
+        # Full scans no longer drag the LONGBLOB pages along
+        cursor.execute("ALTER TABLE manga DROP COLUMN cover_bin")
+    cursor.close()
+
+
+@migration(2, "key urls and manga by ASIN")
+def _asin_keys(conn):
+    migrate_asins(conn)
+
+
+@migration(3, "typed availability, rating and timestamps")
+def _typed_columns(conn):
+    cursor = conn.cursor()
+    # Derived from the legacy text columns, so every writer keeps them in sync
+    add_column_if_missing(
+        cursor, "manga", "is_available", "TINYINT(1) AS (availability = 'Yes') STORED"
+    )
+    add_column_if_missing(
+        cursor, "manga", "rating_value",
+        "DECIMAL(3, 1) AS (IF(rating REGEXP '^[0-9]+(\\\\.[0-9]+)?$', CAST(rating AS DECIMAL(3, 1)), NULL)) STORED",
+    )
+    add_column_if_missing(cursor, "manga", "created_at", "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP")
+    add_column_if_missing(
+        cursor, "manga", "updated_at",
+        "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+    )
+    cursor.close()
+
+
+@migration(4, "indexes for the listing, cover and lease lookups")
+def _hot_query_indexes(conn):
+    cursor = conn.cursor()
+    # Availability filter walks the index in id order, as the keyset pagination needs
+    add_index_if_missing(cursor, "manga", "idx_manga_available_id", "is_available, id")
+    add_index_if_missing(cursor, "manga", "idx_manga_price_id", "price, id")
+    add_index_if_missing(cursor, "manga", "idx_manga_cover_hash", "cover_hash")
+    # Claims read back the rows they leased by token
+    add_index_if_missing(cursor, "urls", "idx_urls_lease_token", "lease_token")
+    add_index_if_missing(cursor, "notifications", "idx_notifications_lease_token", "lease_token")
+    cursor.close()
+
+
+@migration(5, "full-text search and series grouping")
+def _search(conn):
+    cursor = conn.cursor()
+    for column, definition in SERIES_COLUMNS:
+        add_column_if_missing(cursor, "manga", column, definition)
+    cursor.close()
+    backfill_series(conn)
+    cursor = conn.cursor()
+    add_index_if_missing(cursor, "manga", "idx_manga_series_volume", "series, volume")
+    # The first FULLTEXT index rebuilds the table to add its document id
+    if not index_exists(cursor, "manga", FULLTEXT_INDEX):
+        cursor.execute(f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON manga (title, trama)")
+    cursor.close()
+
+
+@migration(6, "cover download retry backoff")
+def _cover_retries(conn):
+    cursor = conn.cursor()
+    for column, definition in COVER_RETRY_COLUMNS:
+        add_column_if_missing(cursor, "cover_sources", column, definition)
+    cursor.close()
+
+
+@migration(7, "availability check failure backoff")
+def _check_failures(conn):
+    cursor = conn.cursor()
+    add_column_if_missing(cursor, "manga", *CHECK_FAILURES_COLUMN)
+    cursor.close()
+
+
+def apply_migrations(conn, lock_timeout=60):
+    """Apply the registered migrations the database has not recorded yet, in version order.
+
+    Runs under a MySQL named lock so concurrent instances don't race. Each
+    applied version is recorded in `schema_migrations`. Returns the versions
+    applied by this call.
+    """
+    cursor = conn.cursor()
+    cursor.execute(CREATE_MIGRATIONS_TABLE)
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, lock_timeout))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise TimeoutError(f"Could not acquire the schema migration lock in {lock_timeout}s")
+    applied = []
+    try:
+        cursor.execute("SELECT version FROM schema_migrations")
+        done = {version for (version,) in cursor.fetchall()}
+        conn.commit()
+        for version, name, fn in MIGRATIONS:
+            if version in done:
+                continue
+            logger.info(f"Applying schema migration {version}: {name}")
+            try:
+                fn(conn)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                    (version, name, time.time()),
+                )
+                conn.commit()
+            except Error as e:
+                conn.rollback()
+                logger.error(f"Schema migration {version} failed: {e}")
+                raise
+            applied.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchall()
+        cursor.close()
+    return applied
+
+
+def explain(cursor, query, params=()):
+    """EXPLAIN `query`; returns one dict per table access (table, type, key, rows)."""
+    cursor.execute(f"EXPLAIN {query}", params)
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """The table accesses of an EXPLAIN plan that read a whole table or a whole index."""
+    return [
+        step for step in plan
+        if step.get("table") and (step.get("type") in ("ALL", "index") or not step.get("key"))
+    ]
@@ -0,0 +1,241 @@
+from requests.adapters import HTTPAdapter
+
+import threading
+import time
+import uuid
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+TELEGRAM_MAX_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n— — —\n\n"
+
+# Persistent outbox: notifications are written in the same transaction as the
+# change that caused them and delivered later by the dispatcher
+CREATE_NOTIFICATIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS notifications (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        message TEXT NOT NULL,
+        status VARCHAR(12) NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        next_attempt_at DOUBLE NOT NULL DEFAULT 0,
+        lease_token VARCHAR(36) NULL,
+        lease_until DOUBLE NULL,
+        created_at DOUBLE NOT NULL,
+        sent_at DOUBLE NULL,
+        last_error TEXT NULL,
+        KEY idx_notifications_due (status, next_attempt_at)
+    );
+'''
+
+
+def enqueue_notification(cursor, message):
+    """Queue a message; runs inside the caller's transaction."""
+    cursor.execute(
+        "INSERT INTO notifications (message, created_at) VALUES (%s, %s)",
+        (message, time.time()),
+    )
+
+
+def build_digests(messages, max_length=TELEGRAM_MAX_LENGTH):
+    """Coalesce messages into as few Telegram-sized texts as possible.
+
+    Returns a list of (text, [message ids]) tuples. A single message is sent as
+    is; several are joined under a header.
+    """
+    digests = []
+    current, current_ids = [], []
+
+    def close():
+        if not current:
+            return
+        if len(current) == 1:
+            text = current[0]
+        else:
+            text = f"{len(current)} updates\n\n" + DIGEST_SEPARATOR.join(current)
+        digests.append((text[:max_length], list(current_ids)))
+
+    for message_id, message in messages:
+        candidate = current + [message]
+        length = len(f"{len(candidate)} updates\n\n" + DIGEST_SEPARATOR.join(candidate))
+        if current and length > max_length:
+            close()
+            current, current_ids = [], []
+        current.append(message)
+        current_ids.append(message_id)
+    close()
+    return digests
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class TelegramDispatcher:
+    """Background thread delivering queued notifications to Telegram.
+
+    Due notifications are leased in batches, coalesced into digest messages and
+    posted through a pooled HTTP session, paced by a token bucket. Failures are
+    retried with exponential backoff (honouring Telegram's `retry_after`) and
+    marked failed after `max_attempts`. `api_url` can point at a local fake.
+    """
+
+    def __init__(self, get_connection, release_connection, api_url, token, chat_id,
+                 rate=1.0, burst=3, batch_size=20, max_attempts=5, backoff_base=30,
+                 poll_interval=10, timeout=10, lease_seconds=120):
+        self.get_connection = get_connection
+        self.release_connection = release_connection
+        self.send_url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.bucket = TokenBucket(rate, burst)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.lease_seconds = lease_seconds
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=2, max_retries=0))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=2, max_retries=0))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="telegram-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delivered = self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Notification dispatcher error: {e}")
+                delivered = 0
+            # Keep draining while there is a backlog, otherwise wait for a wake-up
+            if not delivered:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self, conn):
+        now = time.time()
+        token = str(uuid.uuid4())
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE notifications SET status = 'sending', lease_token = %s, lease_until = %s "
+            "WHERE (status = 'pending' AND next_attempt_at <= %s) OR (status = 'sending' AND lease_until < %s) "
+            "ORDER BY id LIMIT %s",
+            (token, now + self.lease_seconds, now, now, self.batch_size),
+        )
+        conn.commit()
+        cursor.execute("SELECT id, message, attempts FROM notifications WHERE lease_token = %s ORDER BY id", (token,))
+        rows = cursor.fetchall()
+        conn.commit()
+        cursor.close()
+        return rows
+
+    def dispatch_once(self):
+        """Deliver one leased batch; returns the number of notifications sent."""
+        conn = self.get_connection()
+        try:
+            rows = self._claim(conn)
+            if not rows:
+                return 0
+            attempts = {message_id: count for message_id, _, count in rows}
+            sent = 0
+            for text, ids in build_digests([(message_id, message) for message_id, message, _ in rows]):
+                if not self.bucket.acquire(self._stop):
+                    self._reschedule(conn, ids, attempts, "dispatcher stopped", delay=0, count_attempt=False)
+                    continue
+                ok, error, retry_after = self._post(text)
+                if ok:
+                    self._mark_sent(conn, ids)
+                    sent += len(ids)
+                else:
+                    self._reschedule(conn, ids, attempts, error, delay=retry_after)
+            return sent
+        finally:
+            self.release_connection(conn)
+
+    def _post(self, text):
+        try:
+            response = self.session.post(
+                self.send_url, json={"chat_id": self.chat_id, "text": text}, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            return False, str(e), None
+        if response.status_code == 200:
+            return True, None, None
+        retry_after = None
+        try:
+            retry_after = response.json().get("parameters", {}).get("retry_after")
+        except ValueError:
+            pass
+        return False, f"HTTP {response.status_code}: {response.text[:200]}", retry_after
+
+    def _mark_sent(self, conn, ids):
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(
+            f"UPDATE notifications SET status = 'sent', sent_at = %s, lease_token = NULL, lease_until = NULL "
+            f"WHERE id IN ({placeholders})",
+            (time.time(), *ids),
+        )
+        conn.commit()
+        cursor.close()
+        logger.info(f"Telegram digest sent for notifications {ids}")
+
+    def _reschedule(self, conn, ids, attempts, error, delay=None, count_attempt=True):
+        cursor = conn.cursor()
+        now = time.time()
+        for message_id in ids:
+            tries = attempts[message_id] + (1 if count_attempt else 0)
+            if tries >= self.max_attempts:
+                status, next_attempt_at = "failed", now
+            else:
+                status = "pending"
+                next_attempt_at = now + (delay if delay is not None else self.backoff_base * 2 ** max(0, tries - 1))
+            cursor.execute(
+                "UPDATE notifications SET status = %s, attempts = %s, next_attempt_at = %s, "
+                "lease_token = NULL, lease_until = NULL, last_error = %s WHERE id = %s",
+                (status, tries, next_attempt_at, error, message_id),
+            )
+        conn.commit()
+        cursor.close()
+        logger.error(f"Telegram delivery failed for notifications {ids}: {error}")
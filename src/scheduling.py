@@ -0,0 +1,39 @@
+import random
+
+# Per-title scheduling state stored on the `manga` row
+SCHEDULING_COLUMNS = (
+    ("last_checked_at", "DOUBLE NULL"),
+    ("next_check_at", "DOUBLE NOT NULL DEFAULT 0"),
+    ("check_count", "INT NOT NULL DEFAULT 0"),
+    ("stock_changes", "INT NOT NULL DEFAULT 0"),
+    # Starts as a mild prior so new titles are checked fairly often at first
+    ("volatility", "DOUBLE NOT NULL DEFAULT 0.2"),
+)
+
+# Consecutive failed checks, backing off the next one
+CHECK_FAILURES_COLUMN = ("check_failures", "INT NOT NULL DEFAULT 0")
+
+
+def update_volatility(volatility, changed, alpha=0.3):
+    """Exponentially weighted rate of stock changes per check, in [0, 1]."""
+    return (1 - alpha) * volatility + alpha * (1.0 if changed else 0.0)
+
+
+def next_check_interval(available, volatility, min_interval, max_interval, available_interval):
+    """Seconds until a title should be checked again.
+
+    Unavailable titles are checked between `max_interval` (never restocked) and
+    `min_interval` (restocks every check), proportionally to their volatility.
+    Available titles only need the occasional check for price drops or selling
+    out, so they wait `available_interval`, shortened for volatile titles.
+    """
+    volatility = min(1.0, max(0.0, volatility))
+    if available:
+        return max(min_interval, available_interval * (1 - volatility / 2))
+    return max_interval - (max_interval - min_interval) * volatility
+
+
+def schedule_next_check(now, available, volatility, min_interval, max_interval, available_interval, jitter=0.1):
+    interval = next_check_interval(available, volatility, min_interval, max_interval, available_interval)
+    # Spread titles out so they don't all come due in the same tick
+    return now + interval * random.uniform(1 - jitter, 1 + jitter)
@@ -0,0 +1,26 @@
+def index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def add_index_if_missing(cursor, table, index, columns):
+    if not index_exists(cursor, table, index):
+        cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+
+def add_column_if_missing(cursor, table, column, definition):
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
@@ -0,0 +1,139 @@
+from mysql.connector import Error
+
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Series name and volume number parsed from the title, for grouping
+SERIES_COLUMNS = (("series", "VARCHAR(255) NULL"), ("volume", "INT NULL"))
+FULLTEXT_INDEX = "ft_manga_title_trama"
+
+# InnoDB indexes words of at least innodb_ft_min_token_size (3) characters and
+# drops its default stopwords, a `+stopword*` term would match nothing
+MIN_TOKEN_LENGTH = 3
+STOPWORDS = frozenset((
+    "a about an are as at be by com de en for from how i in is it la of on or that the this to was what when "
+    "where who will with und www"
+).split())
+
+# "One Piece. Vol. 100", "Berserk (Vol. 3)", "Naruto vol.12: Il mito", "Tomo 4", "N. 7"...
+_VOLUME_MARKER = re.compile(
+    r"^(?P<series>.+?)[\s.,:;(\[\-–—]*\b(?:vol(?:ume)?|tomo|n[or]?|num|book)\.?\s*(?P<volume>\d{1,4})\b",
+    re.IGNORECASE,
+)
+# ...or a bare trailing number: "Chainsaw Man 5", "Monster: 2", "Dorohedoro #10"
+_TRAILING_NUMBER = re.compile(r"^(?P<series>.+?)[\s.,:;#\-–—(]+(?P<volume>\d{1,4})\)?$")
+_SERIES_TRIM = " .,:;-–—([#"
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+SEARCH_COLUMNS = "id, title, series, volume, price, availability, cover, url"
+
+
+def parse_series(title):
+    """Split a volume title into `(series, volume)`; volume is None for one-shots."""
+    title = " ".join((title or "").split())
+    if not title:
+        return None, None
+    for pattern in (_VOLUME_MARKER, _TRAILING_NUMBER):
+        match = pattern.match(title)
+        if match:
+            series = match.group("series").rstrip(_SERIES_TRIM)
+            if series:
+                return series[:255], int(match.group("volume"))
+    return title.rstrip(_SERIES_TRIM)[:255] or None, None
+
+
+def boolean_query(text):
+    """Turn free text into a MATCH ... IN BOOLEAN MODE query requiring every word as a prefix.
+
+    Operators typed by the user are dropped, so the result is always a valid
+    query. Returns None when no word is long enough to be in the index.
+    """
+    words = []
+    for word in _WORD.findall((text or "").lower()):
+        if len(word) >= MIN_TOKEN_LENGTH and word not in STOPWORDS and word not in words:
+            words.append(word)
+    if not words:
+        return None
+    return " ".join(f"+{word}*" for word in words)
+
+
+def search(cursor, text, page=1, page_size=30, availability=None):
+    """One page of titles matching `text` in their title or plot, best match first.
+
+    Returns `(rows, has_next)`; rows are dicts with the relevance `score`.
+    """
+    query = boolean_query(text)
+    if query is None:
+        return [], False
+    where = "MATCH (title, trama) AGAINST (%s IN BOOLEAN MODE)"
+    params = [query]
+    if availability in ("Yes", "No"):
+        where += " AND is_available = %s"
+        params.append(availability == "Yes")
+    cursor.execute(
+        f"SELECT {SEARCH_COLUMNS}, MATCH (title, trama) AGAINST (%s IN BOOLEAN MODE) AS score "
+        f"FROM manga WHERE {where} ORDER BY score DESC, id LIMIT %s OFFSET %s",
+        [query, *params, page_size + 1, (page - 1) * page_size],
+    )
+    rows = cursor.fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+
+def search_series(cursor, text, page=1, page_size=30, availability=None):
+    """Like `search`, grouped by series: one row per series with its matching volume range."""
+    query = boolean_query(text)
+    if query is None:
+        return [], False
+    where = "MATCH (title, trama) AGAINST (%s IN BOOLEAN MODE) AND series IS NOT NULL"
+    params = [query]
+    if availability in ("Yes", "No"):
+        where += " AND is_available = %s"
+        params.append(availability == "Yes")
+    cursor.execute(
+        "SELECT series, COUNT(*) AS volumes, MIN(volume) AS first_volume, MAX(volume) AS last_volume, "
+        "SUM(is_available) AS available, MAX(MATCH (title, trama) AGAINST (%s IN BOOLEAN MODE)) AS score "
+        f"FROM manga WHERE {where} GROUP BY series ORDER BY score DESC, series LIMIT %s OFFSET %s",
+        [query, *params, page_size + 1, (page - 1) * page_size],
+    )
+    rows = cursor.fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+
+def series_volumes(cursor, series):
+    """Every volume of a series in volume order, one-shots and unnumbered volumes last."""
+    cursor.execute(
+        f"SELECT {SEARCH_COLUMNS} FROM manga WHERE series = %s ORDER BY volume IS NULL, volume, id",
+        (series,),
+    )
+    return cursor.fetchall()
+
+
+def backfill_series(conn, batch_size=500):
+    """Fill `series` and `volume` for the titles written before they existed."""
+    cursor = conn.cursor()
+    last_id = 0
+    updated = 0
+    try:
+        while True:
+            cursor.execute(
+                "SELECT id, title FROM manga WHERE series IS NULL AND id > %s ORDER BY id LIMIT %s",
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = [(*parse_series(title), row_id) for row_id, title in rows if title]
+            if updates:
+                cursor.executemany("UPDATE manga SET series = %s, volume = %s WHERE id = %s", updates)
+                updated += len(updates)
+            conn.commit()
+        logger.info(f"Series parsed for {updated} titles")
+    except Error as e:
+        conn.rollback()
+        logger.error(f"Series backfill failed: {e}")
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,151 @@
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Only Chromium exposes performance.memory, Firefox returns null and sessions
+# are then recycled on page count and idle time alone, without probing again.
+MEMORY_SCRIPT = (
+    "return (window.performance && performance.memory)"
+    " ? performance.memory.usedJSHeapSize : null;"
+)
+
+
+class _Session:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.baseline_memory = None
+
+
+class DriverPool:
+    """Long-lived WebDriver sessions shared across scheduler ticks.
+
+    Sessions are opened lazily the first time a worker needs a browser, health
+    checked before being handed out, and recycled after `max_pages` page loads,
+    when the JS heap grew by more than `max_memory_growth_mb`, or after sitting
+    idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, factory, max_sessions=1, max_pages=200, max_memory_growth_mb=500, idle_timeout=600):
+        self.factory = factory
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_pages = max_pages
+        self.max_memory_growth = max_memory_growth_mb * 1024 * 1024
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_sessions)
+        self._idle = []
+        self._created = 0
+        self._recycled = 0
+        # Every session comes from the same browser: one null answer settles it
+        self._memory_supported = True
+
+    @contextmanager
+    def session(self):
+        session = self.acquire()
+        broken = False
+        try:
+            yield session.driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(session, broken=broken)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            self.close_idle()
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    session = _Session(self.factory())
+                    with self._lock:
+                        self._created += 1
+                    logger.info("Opened a new Selenium session")
+                    return session
+                if self._healthy(session):
+                    return session
+                self._quit(session, reason="failed health check")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, session, broken=False):
+        try:
+            session.pages += 1
+            session.last_used = time.monotonic()
+            if broken:
+                self._quit(session, reason="WebDriver error")
+            elif session.pages >= self.max_pages:
+                self._quit(session, reason=f"{session.pages} pages served")
+            elif self._memory_exceeded(session):
+                self._quit(session, reason="memory growth")
+            else:
+                with self._lock:
+                    self._idle.append(session)
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            stale = [s for s in self._idle if now - s.last_used > self.idle_timeout]
+            self._idle = [s for s in self._idle if s not in stale]
+        for session in stale:
+            self._quit(session, reason="idle timeout")
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._quit(session, reason="shutdown")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_sessions": self.max_sessions,
+                "idle": len(self._idle),
+                "created": self._created,
+                "recycled": self._recycled,
+            }
+
+    def _healthy(self, session):
+        try:
+            return session.driver.execute_script("return 1;") == 1
+        except WebDriverException:
+            return False
+
+    def _memory_exceeded(self, session):
+        if not self._memory_supported:
+            return False
+        try:
+            used = session.driver.execute_script(MEMORY_SCRIPT)
+        except WebDriverException:
+            return True
+        if used is None:
+            self._memory_supported = False
+            logger.info("The browser does not report its JS heap size, memory-based recycling is off")
+            return False
+        if session.baseline_memory is None:
+            session.baseline_memory = used
+            return False
+        return used - session.baseline_memory > self.max_memory_growth
+
+    def _quit(self, session, reason):
+        with self._lock:
+            self._recycled += 1
+        logger.info(f"Recycling Selenium session: {reason}")
+        try:
+            session.driver.quit()
+        except WebDriverException as e:
+            logger.error(f"Error closing Selenium session: {e}")
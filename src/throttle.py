@@ -0,0 +1,178 @@
+import threading
+import time
+import logging
+
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Outcomes reported back to the throttle after each request
+OK = "ok"
+ERROR = "error"
+BLOCKED = "blocked"
+
+# After an error the pacing never drops below one request per second
+BACKOFF_FLOOR = 1.0
+
+
+class CircuitOpenError(Exception):
+    """The host is cooling down after blocks or repeated errors; retry after `retry_at`."""
+
+    def __init__(self, host, retry_at):
+        super().__init__(f"Circuit open for {host} for another {max(0, retry_at - time.time()):.0f}s")
+        self.host = host
+        self.retry_at = retry_at
+
+
+class _HostState:
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_slot = 0.0
+        self.failures = 0
+        # Consecutive trips, doubling the cool-down each time
+        self.trips = 0
+        self.open_until = 0.0
+        self.probe_until = 0.0
+
+
+class HostThrottle:
+    """Per-host politeness limits shared by every scraper worker.
+
+    Caps the number of concurrent requests against a single host and spaces
+    consecutive requests to that host. The spacing adapts (AIMD): every
+    healthy response adds `rate_step` requests per second, down to
+    `min_interval` between requests, and every error halves the rate, up to
+    `max_interval`.
+
+    A host that serves a block page, or fails `failure_threshold` times in a
+    row, gets its circuit opened: `slot` raises `CircuitOpenError` without
+    touching the network for `cooldown` seconds, doubled on each consecutive
+    trip up to `max_cooldown`. Then a single probe request is let through and
+    its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, max_concurrent=2, min_interval=1.0, start_interval=None, max_interval=30.0,
+                 rate_step=0.05, failure_threshold=5, cooldown=60.0, max_cooldown=3600.0, probe_timeout=120.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.min_interval = max(0.0, float(min_interval))
+        self.max_interval = max(self.min_interval, float(max_interval))
+        self.start_interval = min(self.max_interval, max(
+            self.min_interval, float(start_interval if start_interval is not None else min_interval)
+        ))
+        self.rate_step = float(rate_step)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self.max_cooldown = max(self.cooldown, float(max_cooldown))
+        self.probe_timeout = float(probe_timeout)
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._hosts = {}
+
+    @staticmethod
+    def host(url):
+        return urlparse(url).netloc.lower()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_concurrent)
+            return self._slots[host]
+
+    def _state(self, host):
+        # Callers hold self._lock
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.start_interval)
+        return self._hosts[host]
+
+    def _admit(self, host):
+        # Raise while the circuit is open; once it expires, let one probe through at a time
+        with self._lock:
+            state = self._state(host)
+            now = time.time()
+            if state.open_until == 0:
+                return
+            if now < state.open_until or now < state.probe_until:
+                raise CircuitOpenError(host, max(state.open_until, state.probe_until))
+            state.probe_until = now + self.probe_timeout
+            logger.info(f"Probing {host} after its cool-down")
+
+    def _reserve(self, host):
+        # Reserve the next start time for this host and return how long to wait
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            start = max(now, state.next_slot)
+            state.next_slot = start + state.interval
+            return start - now
+
+    def slot(self, url):
+        return _HostSlot(self, self.host(url))
+
+    def record(self, url, outcome):
+        """Adapt the pacing and the circuit of `url`'s host to the outcome of a request."""
+        host = self.host(url)
+        with self._lock:
+            state = self._state(host)
+            if outcome == OK:
+                if state.interval > 0:
+                    state.interval = max(self.min_interval, 1 / (1 / state.interval + self.rate_step))
+                state.failures = 0
+                if state.open_until:
+                    logger.info(f"Circuit closed for {host}")
+                state.trips = 0
+                state.open_until = state.probe_until = 0.0
+                return
+            state.interval = min(self.max_interval, max(state.interval * 2, BACKOFF_FLOOR))
+            if time.time() < state.open_until:
+                # A request started before the circuit opened
+                return
+            state.failures += 1
+            # A failed probe reopens the circuit straight away
+            if outcome == BLOCKED or state.failures >= self.failure_threshold or state.open_until:
+                state.trips += 1
+                cooldown = min(self.max_cooldown, self.cooldown * 2 ** (state.trips - 1))
+                state.open_until = time.time() + cooldown
+                state.probe_until = 0.0
+                state.failures = 0
+                logger.warning(
+                    f"Circuit opened for {host} for {cooldown:.0f}s after {'a block page' if outcome == BLOCKED else 'errors'}"
+                    f" (trip {state.trips}), requests spaced {state.interval:.1f}s apart"
+                )
+
+    def retry_at(self, url):
+        """When requests to `url`'s host may resume; now when its circuit is closed."""
+        with self._lock:
+            state = self._state(self.host(url))
+            return max(time.time(), state.open_until, state.probe_until)
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            return {
+                host: {
+                    "interval": round(state.interval, 3),
+                    "circuit": "closed" if not state.open_until else "open" if now < state.open_until else "half-open",
+                    "retry_in": round(max(0.0, state.open_until - now), 1),
+                    "trips": state.trips,
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+class _HostSlot:
+    def __init__(self, throttle, host):
+        self.throttle = throttle
+        self.host = host
+        self.semaphore = throttle._semaphore(host)
+
+    def __enter__(self):
+        self.throttle._admit(self.host)
+        self.semaphore.acquire()
+        delay = self.throttle._reserve(self.host)
+        if delay > 0:
+            time.sleep(delay)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+        return False
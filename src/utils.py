@@ -1,17 +1,46 @@
-import mysql.connector
 from mysql.connector import Error
 
 from selenium import webdriver
 #from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.remote.webdriver import BaseWebDriver, WebDriver
 #from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
 
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 
+from concurrent.futures import ThreadPoolExecutor
+
+from .covers import DiskLRUCache, parse_sizes, render_thumbnail
+from .asin import canonical_url
+from .blobstore import CREATE_COVER_BLOBS_TABLE, load_blob
+from .cover_fetcher import CREATE_COVER_SOURCES_TABLE, CoverFetcher
+from .db_pool import ConnectionPool
+from .extractors import (
+    BlockedError, HttpExtractor, extract_with_driver, is_complete, parse_product,
+    product_fingerprint, CAPTCHA_SELECTOR, TITLE_SELECTOR, OUT_OF_STOCK_SELECTOR, PRICE_SELECTOR,
+)
+from .history import CREATE_HISTORY_TABLE, get_history, price_drop, record_change, record_initial
+from .leader import CREATE_LEASES_TABLE
+from .logging_setup import bind_context, log_context
+from .metrics import (
+    AVAILABILITY_CHECKS, DB_ACQUIRE_SECONDS, DB_POOL, FAILURES, HOST_CIRCUIT_OPEN, HOST_INTERVAL, PAGES, QUEUE_DEPTH,
+    STAGE_SECONDS, job_tracker, timed,
+)
+from .migrations import apply_migrations
+from .notifications import CREATE_NOTIFICATIONS_TABLE, TelegramDispatcher, enqueue_notification
+from .scheduling import schedule_next_check, update_volatility
+from .search import parse_series, search, search_series, series_volumes
+from .sessions import DriverPool
+from .throttle import BLOCKED, ERROR, OK, CircuitOpenError, HostThrottle
+from .work_queue import WorkQueue
+
 import time
+import uuid
+import queue
 import socket
 import requests
 import re
@@ -21,6 +50,174 @@ import os
 logger = logging.getLogger(__name__)  # the __name__ resolve to "uicheckapp.services"
 load_dotenv()
 
+# Process-wide MySQL connection pool
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+
+db_pool = ConnectionPool(
+    {
+        "host": os.getenv('MYSQL_HOST'),
+        "port": int(os.getenv('MYSQL_PORT', 3306)),
+        "user": os.getenv('MYSQL_USER'),
+        "password": os.getenv('MYSQL_PASSWD'),
+        "database": os.getenv('DB'),
+    },
+    size=DB_POOL_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+)
+
+# Rows per multi-row INSERT transaction
+DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', 500))
+# Scraped volumes buffered per worker before they are written
+SCRAPE_FLUSH_SIZE = int(os.getenv('SCRAPE_FLUSH_SIZE', 20))
+
+# Titles are unique per ASIN: a title scraped again only refreshes its
+# metadata, price and stock changes are left to the availability checks
+MANGA_COLUMNS = (
+    "title", "url", "price", "availability", "rating", "trama", "cover", "fingerprint", "page_etag",
+    "page_last_modified", "asin", "series", "volume",
+)
+INSERT_MANGA_SQL = f'''
+    INSERT INTO manga ({", ".join(MANGA_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(MANGA_COLUMNS))})
+    ON DUPLICATE KEY UPDATE title = VALUES(title), rating = VALUES(rating), trama = VALUES(trama), cover = VALUES(cover),
+        series = VALUES(series), volume = VALUES(volume)
+'''
+
+# Scheduling-only update for titles whose page did not change
+RESCHEDULE_MANGA_SQL = '''
+    UPDATE manga SET last_checked_at = %s, next_check_at = %s, check_count = check_count + 1, volatility = %s,
+        page_etag = %s, page_last_modified = %s, check_failures = 0
+    WHERE id = %s
+'''
+
+# Durable scrape queue: lease length, attempts before dead-lettering, retry backoff
+QUEUE_LEASE_SECONDS = int(os.getenv('QUEUE_LEASE_SECONDS', 900))
+QUEUE_MAX_ATTEMPTS = int(os.getenv('QUEUE_MAX_ATTEMPTS', 5))
+QUEUE_BACKOFF_SECONDS = int(os.getenv('QUEUE_BACKOFF_SECONDS', 60))
+
+url_queue = WorkQueue(
+    table="urls",
+    lease_seconds=QUEUE_LEASE_SECONDS,
+    max_attempts=QUEUE_MAX_ATTEMPTS,
+    backoff_base=QUEUE_BACKOFF_SECONDS,
+    # One queue item per ASIN, duplicates are rejected by the unique index
+    key_column="asin",
+)
+
+# Adaptive availability checks: bounds (seconds) between two checks of a title
+AVAILABILITY_MIN_INTERVAL = int(os.getenv('AVAILABILITY_MIN_INTERVAL', 1800))
+AVAILABILITY_MAX_INTERVAL = int(os.getenv('AVAILABILITY_MAX_INTERVAL', 43200))
+AVAILABLE_CHECK_INTERVAL = int(os.getenv('AVAILABLE_CHECK_INTERVAL', 86400))
+# Max titles checked per scheduler tick
+AVAILABILITY_BATCH_LIMIT = int(os.getenv('AVAILABILITY_BATCH_LIMIT', 500))
+
+# Alert when an available title gets at least this much cheaper (percent)
+PRICE_DROP_ALERT_PCT = float(os.getenv('PRICE_DROP_ALERT_PCT', 5))
+
+# Telegram notifications: delivered in the background, rate limited and
+# coalesced into digests. TELEGRAM_API_URL can point at a local fake.
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_RATE = float(os.getenv('TELEGRAM_RATE', 1))
+TELEGRAM_BURST = int(os.getenv('TELEGRAM_BURST', 3))
+TELEGRAM_MAX_ATTEMPTS = int(os.getenv('TELEGRAM_MAX_ATTEMPTS', 5))
+
+telegram_dispatcher = TelegramDispatcher(
+    db_pool.acquire,
+    db_pool.release,
+    TELEGRAM_API_URL,
+    os.getenv('TELE_BOT_TOKEN'),
+    os.getenv('TELE_CHAT_ID'),
+    rate=TELEGRAM_RATE,
+    burst=TELEGRAM_BURST,
+    max_attempts=TELEGRAM_MAX_ATTEMPTS,
+)
+
+# Cards per /list-all page
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', 30))
+
+# Cover thumbnails served from the stored cover blobs, cached on disk
+COVER_SIZES = parse_sizes(os.getenv('COVER_SIZES', 'thumb:200,medium:400'))
+COVER_CACHE_DIR = os.getenv('COVER_CACHE_DIR', 'cache/covers')
+COVER_CACHE_MAX_MB = int(os.getenv('COVER_CACHE_MAX_MB', 256))
+
+cover_cache = DiskLRUCache(COVER_CACHE_DIR, COVER_CACHE_MAX_MB * 1024 * 1024)
+
+# Cover download stage: concurrency, timeout, size cap and revalidation age
+COVER_FETCH_CONCURRENCY = int(os.getenv('COVER_FETCH_CONCURRENCY', 4))
+COVER_FETCH_TIMEOUT = float(os.getenv('COVER_FETCH_TIMEOUT', 15))
+COVER_MAX_BYTES = int(os.getenv('COVER_MAX_BYTES', 5 * 1024 * 1024))
+COVER_REFRESH_SECONDS = int(os.getenv('COVER_REFRESH_SECONDS', 30 * 86400))
+COVER_RETRY_SECONDS = int(os.getenv('COVER_RETRY_SECONDS', 3600))
+COVER_MAX_RETRY_SECONDS = int(os.getenv('COVER_MAX_RETRY_SECONDS', 7 * 86400))
+
+cover_fetcher = CoverFetcher(
+    db_pool.acquire,
+    db_pool.release,
+    concurrency=COVER_FETCH_CONCURRENCY,
+    timeout=COVER_FETCH_TIMEOUT,
+    max_bytes=COVER_MAX_BYTES,
+    refresh_seconds=COVER_REFRESH_SECONDS,
+    retry_seconds=COVER_RETRY_SECONDS,
+    max_retry_seconds=COVER_MAX_RETRY_SECONDS,
+)
+
+# Selenium Grid worker pool settings
+SELENIUM_HUB_URL = os.getenv('SELENIUM_HUB_URL', "http://selenium:4444/wd/hub")
+SCRAPER_WORKERS = int(os.getenv('SCRAPER_WORKERS', 1))
+HOST_MAX_CONCURRENT = int(os.getenv('HOST_MAX_CONCURRENT', 2))
+# Request spacing per host adapts between MIN and MAX seconds, starting at START
+HOST_MIN_INTERVAL = float(os.getenv('HOST_MIN_INTERVAL', 1))
+HOST_START_INTERVAL = float(os.getenv('HOST_START_INTERVAL', 2))
+HOST_MAX_INTERVAL = float(os.getenv('HOST_MAX_INTERVAL', 30))
+HOST_RATE_STEP = float(os.getenv('HOST_RATE_STEP', 0.05))
+# Per-host circuit breaker: consecutive errors before opening, cool-down bounds (seconds)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_COOLDOWN = float(os.getenv('CIRCUIT_COOLDOWN', 300))
+CIRCUIT_MAX_COOLDOWN = float(os.getenv('CIRCUIT_MAX_COOLDOWN', 7200))
+
+# Long-lived browser sessions, recycled after N pages, memory growth or idling
+SESSION_MAX_PAGES = int(os.getenv('SESSION_MAX_PAGES', 200))
+SESSION_MAX_MEMORY_GROWTH_MB = int(os.getenv('SESSION_MAX_MEMORY_GROWTH_MB', 500))
+SESSION_IDLE_TIMEOUT = int(os.getenv('SESSION_IDLE_TIMEOUT', 240))
+
+# Page readiness: wait for the extracted elements instead of sleeping
+PAGE_READY_TIMEOUT = float(os.getenv('PAGE_READY_TIMEOUT', 15))
+PAGE_LATENCY_BUDGET = float(os.getenv('PAGE_LATENCY_BUDGET', 5))
+
+# Resolves once every `required` selector matches and, if `any_of` is given,
+# at least one of those matches or the document has finished loading. A match
+# on a `blockers` selector (a captcha) resolves at once.
+PAGE_READY_SCRIPT = '''
+const [required, anyOf, blockers] = arguments;
+const found = s => document.querySelector(s) !== null;
+return blockers.some(found) || required.every(found)
+    && (anyOf.length === 0 || anyOf.some(found) || document.readyState === 'complete');
+'''
+
+page_latencies = deque(maxlen=1000)
+
+# Extraction backend: "http" (no browser), "selenium", or "auto" (http first,
+# Selenium only when the required fields are missing from the raw HTML)
+EXTRACTOR_BACKEND = os.getenv('EXTRACTOR_BACKEND', 'auto').lower()
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 15))
+
+http_extractor = HttpExtractor(pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT)
+# Returned by fetch_product when a conditional request found the page unchanged
+NOT_MODIFIED = object()
+
+host_throttle = HostThrottle(
+    max_concurrent=HOST_MAX_CONCURRENT,
+    min_interval=HOST_MIN_INTERVAL,
+    start_interval=HOST_START_INTERVAL,
+    max_interval=HOST_MAX_INTERVAL,
+    rate_step=HOST_RATE_STEP,
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    cooldown=CIRCUIT_COOLDOWN,
+    max_cooldown=CIRCUIT_MAX_COOLDOWN,
+)
+
 
 def sleep(seconds):
     time.sleep(seconds)
@@ -34,51 +231,44 @@ def wait_for_db(host="mysql", port=3306, timeout=60):
     while time.time() - start_time < timeout:
         try:
             with socket.create_connection((host, port), timeout=5):
-                logger.info("******************")
                 logger.info("Database is ready!")
-                logger.info("******************")
                 return True
         except (OSError, socket.error):
-            logger.error("----")
             logger.error("Waiting for database connection...")
-            logger.error("----")
             time.sleep(2)
     raise TimeoutError(f"Database not available after {timeout} seconds")
 
 def create_connection(input_msg):
     clock = get_time()
-    retries = 5
-    while retries > 0:
-        try:
-            conn = mysql.connector.connect(
-                host=os.getenv('MYSQL_HOST'),
-                user=os.getenv('MYSQL_USER'),
-                password=os.getenv('MYSQL_PASSWD'),
-                database=os.getenv('DB')
-            )
-            if conn.is_connected():
-                logger.info("****************************************************************")
-                logger.info(f"{input_msg} successfully connected to MySQL database at {clock}")
-                logger.info("****************************************************************")
-                return conn
-        except Error as e:
-            logger.error("----")
-            logger.error(f"{input_msg} failed to connect to DB. Retrying in 5 seconds... Error: {e}")
-            logger.error("----")
-            retries -= 1
-            time.sleep(5)
-
-    logger.error("----")
-    logger.error(f"{input_msg} unabled to connect to MySQL after multiple attempts at {clock}")
-    logger.error("----")
-    return None
+    try:
+        start = time.perf_counter()
+        conn = db_pool.acquire()
+        DB_ACQUIRE_SECONDS.observe(time.perf_counter() - start)
+        logger.debug(f"{input_msg} acquired a pooled MySQL connection at {clock}")
+        return conn
+    except Error as e:
+        logger.error(f"{input_msg} unabled to get a MySQL connection at {clock}: {e}")
+        raise
 
 def close_connection(conn):
-    if conn.is_connected():
-        conn.close()
+    # Hand the connection back to the pool instead of closing the socket
+    if conn is not None:
+        db_pool.release(conn)
+
+@contextmanager
+def pooled_connection(input_msg):
+    """Borrow a pooled connection for the duration of a `with` block."""
+    conn = create_connection(input_msg=input_msg)
+    try:
+        yield conn
+    finally:
+        close_connection(conn)
+
+def get_db_pool_stats():
+    return db_pool.stats()
 
 def create_tables():
-    wait_for_db(host="mysql", port=3306)
+    wait_for_db(host=os.getenv('MYSQL_HOST', 'mysql'), port=int(os.getenv('MYSQL_PORT', 3306)))
     conn = create_connection(input_msg='Creation Table')
     cursor = conn.cursor()
 
@@ -92,8 +282,7 @@ def create_tables():
             availability VARCHAR(10),
             rating VARCHAR(10),
             trama TEXT,
-            cover TEXT,
-            cover_bin LONGBLOB
+            cover TEXT
         );
     '''
 
@@ -104,382 +293,916 @@ def create_tables():
         );
     '''
 
+    # Single-row counter bumped by every write to `manga`, used to key caches
+    create_version_table = '''
+        CREATE TABLE IF NOT EXISTS catalogue_version (
+            id TINYINT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        );
+    '''
+
     try:
-        # Create both tables
+        # Create the tables
         cursor.execute(create_manga_table)
         cursor.execute(create_urls_table)
+        cursor.execute(create_version_table)
+        cursor.execute("INSERT IGNORE INTO catalogue_version (id, version) VALUES (1, 0)")
+        cursor.execute(CREATE_COVER_BLOBS_TABLE)
+        cursor.execute(CREATE_HISTORY_TABLE)
+        cursor.execute(CREATE_NOTIFICATIONS_TABLE)
+        cursor.execute(CREATE_COVER_SOURCES_TABLE)
+        cursor.execute(CREATE_LEASES_TABLE)
         conn.commit()
-        logger.info("****************************")
         logger.info("Tables created successfully!")
-        logger.info("****************************")
+        applied = apply_migrations(conn)
+        if applied:
+            logger.info(f"Schema migrations applied: {applied}")
     except Error as e:
-        logger.error("----")
         logger.error(f"Error creating tables: {e}")
-        logger.error("----")
     finally:
         close_connection(conn)
 
-def add_url(url):
+def add_urls(urls):
+    """Queue many URLs with multi-row inserts, one transaction per batch.
+
+    URLs are canonicalised to `/dp/<ASIN>`. URLs without an ASIN are
+    rejected as invalid. ASINs already queued or scraped are rejected as
+    duplicates by the unique indexes, before any scraping is scheduled; queued
+    ASINs that ended up dead are retried instead.
+    Returns the counts of added, duplicate and invalid URLs. Database errors
+    are raised, after rolling back the batch being written.
+    """
+    summary = {"added": 0, "duplicates": 0, "invalid": 0}
+    canonical = {}
+    for url in urls:
+        asin, url = canonical_url(url)
+        if asin is None:
+            summary["invalid"] += 1
+        elif asin in canonical:
+            summary["duplicates"] += 1
+        else:
+            canonical[asin] = url
+
+    items = list(canonical.items())
+    conn = None
     try:
-        conn = create_connection(input_msg='Add URL')
+        conn = create_connection(input_msg='Add URLs')
         cursor = conn.cursor()
-        cursor.execute("INSERT INTO urls (url) VALUES (%s)", (url,))
-        conn.commit()
-        logger.info("************************************")
-        logger.info(f'Successfully added {url} to the DB!')
-        logger.info("************************************")
+        for start in range(0, len(items), DB_BATCH_SIZE):
+            batch = items[start:start + DB_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"SELECT asin FROM manga WHERE asin IN ({placeholders})", [asin for asin, _ in batch])
+            scraped = {asin for (asin,) in cursor.fetchall()}
+            added = url_queue.enqueue(cursor, [item for item in batch if item[0] not in scraped])
+            conn.commit()
+            summary["added"] += added
+            summary["duplicates"] += len(batch) - added
+        logger.info(f"URLs submitted: {summary}")
     except Error as e:
-        logger.error("----")
-        logger.error(f"Error inserting Url: {e}")
-        logger.error("----")
+        if conn is not None:
+            conn.rollback()
+        logger.error(f"Error inserting Urls: {e}")
+        raise
     finally:
         close_connection(conn)
+    return summary
 
-def download_image(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        logger.info("**************************************")
-        logger.info(f"Image: {url} successfully downloaded!")
-        logger.info("**************************************")
-        return response.content  # Binary data of the image
-    else:
-        logger.error("----")
-        logger.error(f"Failed to download image {url}. Status code: {response.status_code}")
-        logger.error("----")
+def add_url(url):
+    return add_urls([url])
 
-def url_scanner(driver: WebDriver):
-    conn = create_connection(input_msg='URL Scanner')
-    cursor = conn.cursor()
+def bump_catalogue_version(cursor):
+    # Runs inside the caller's transaction, committed together with the write
+    cursor.execute("UPDATE catalogue_version SET version = version + 1 WHERE id = 1")
+
+def get_catalogue_version():
+    conn = create_connection(input_msg='Catalogue Version')
     try:
-        cursor.execute("SELECT id, url FROM urls")
-        urls = cursor.fetchall()
-        if urls:
-            for url_tuple in urls:
-                url_id = url_tuple[0]
-                url = url_tuple[1]
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM catalogue_version WHERE id = 1")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    finally:
+        close_connection(conn)
 
-                driver.get(url)
-                sleep(7)
+def list_mangas(after_id=None, limit=LIST_PAGE_SIZE, availability=None, min_price=None, max_price=None):
+    """Return one keyset-paginated page of the catalogue and the next cursor.
 
-                # Retrive Title
-                v_n = driver.find_element(By.ID, 'productTitle')
-                title = v_n.text
+    Only the columns rendered by the listing are read. `next_after` is the id to
+    pass as `after_id` for the following page, None on the last page.
+    """
+    where = []
+    params = []
+    if after_id is not None:
+        where.append("id > %s")
+        params.append(after_id)
+    if availability in ("Yes", "No"):
+        where.append("is_available = %s")
+        params.append(availability == "Yes")
+    if min_price is not None:
+        where.append("price >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("price <= %s")
+        params.append(max_price)
 
-                # Retrive Availability
-                try:
-                    # Try to find the element with id 'outOfStock'
-                    driver.find_element(By.ID, 'outOfStock')
-                    # If found, set availability to 'No'
-                    availability = 'No'
-                except NoSuchElementException:
-                    # If not found, the product is available
-                    availability = 'Yes'
-
-                # Retrive Price
-                price = None
-                try:
-                    # Find the price element using JavaScript's querySelector
-                    price_element = driver.execute_script(
-                        'return document.querySelector(".a-section.a-spacing-none.aok-align-center.aok-relative span.aok-offscreen")'
-                    )
-                    # If not Null
-                    if price_element:
-                        # Get the text
-                        price = driver.execute_script("return arguments[0].textContent", price_element)
-                except NoSuchElementException:
-                    # Catch exception if NoSuchElementException is raised
-                    logger.error("----")
-                    logger.error(f'Error retriving the Price for: {url} - {title}')
-                    logger.error("----")
-
-                # Ensure `price` has a default value if None
-                if price is None:
-                    price = ""  # Set price to an empty string if not found
-                    availability = 'No'
-
-                # Retrive Rating
-                rating = None
-                try:
-                    rating = driver.find_element(By.ID, "acrPopover").text
-                except NoSuchElementException:
-                    rating = None
-                    logger.error("----")
-                    logger.error(f'Error retriving the Rating for: {url} - {title}')
-                    logger.error("----")
-                # Ensure `rating` has a default value if None
-                if rating is None:
-                    rating = ""  # Set price to an empty string if not found
-
-                # Retrive Trama
-                trama = None
-                try:
-                    book_description_div = driver.find_element(By.ID, "bookDescription_feature_div")
-                    trama = book_description_div.find_element(By.TAG_NAME, "span").text
-                except NoSuchElementException:
-                    trama = None
-                    logger.error("----")
-                    logger.error(f'Error retriving the Trama for: {url} - {title}')
-                    logger.error("----")
-                
-
-                # Retrive Cover
-                cover_bin = None
-                try:
-                    image_element = driver.find_element(By.ID, 'landingImage')
-                    image_url = image_element.get_attribute('src')
-                    cover_bin = download_image(image_url) if image_url else None
-                    # Download Cover
-                    # cover_bin = download_image(image_url)
-                except NoSuchElementException:
-                    image_url = None
-                    logger.error("----")
-                    logger.error(f'Error retriving the Cover URL for: {url} - {title}')
-                    logger.error("----")
-        
-                volume_json = {
-                    "title": title,
-                    "url": url,
-                    "price": price,
-                    "availability": availability,
-                    "rating": rating,
-                    "trama": trama,
-                    "cover": image_url,
-                    "cover_bin": cover_bin
-                }
-
-                # Clean price
-                if price:
-                    cleaned_price = re.sub(r'[^\d,]', '', price).replace(',', '.')
-                    cleaned_price = float(cleaned_price) if cleaned_price else None
-                else:
-                    cleaned_price = 0.00
-
-                if volume_json != None:
-                    logger.info('*****************************************************************')
-                    logger.info(f"JSON populated for URL {url} Manga's ID: {url_id}")
-                    logger.info('*****************************************************************')
-
-                # Insert into DB
-                try:
-                    # Prepare the SQL statement with placeholders
-                    sql = '''
-                    INSERT INTO manga (title, url, price, availability, rating, trama, cover, cover_bin)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    '''
-                    # Execute the query with the values from volume_json as a tuple
-                    # Prepare the values, replacing None with a suitable value (like `None` for SQL)
-                    values = (
-                        volume_json["title"],
-                        volume_json["url"],
-                        #cleaned_price,  # Clean whitespace from price
-                        cleaned_price if cleaned_price else 0.00,
-                        volume_json["availability"],
-                        volume_json["rating"].replace(',', '.'),  # Replace comma with a dot for numeric format
-                        volume_json["trama"],  # This can remain as None
-                        volume_json["cover"],
-                        volume_json["cover_bin"]
-                    )
-                    
-                    if values != None:
-                        logger.info('*****************************************************************')
-                        logger.info(f"SQL Built for URL {url} Manga's ID: {url_id}")
-                        logger.info('*****************************************************************')
-
-                    # Execute Insert
+    query = "SELECT id, title, price, availability, cover, trama, url FROM manga"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    # One extra row tells whether there is a next page
+    query += " ORDER BY id LIMIT %s"
+    params.append(limit + 1)
+
+    conn = create_connection(input_msg='List Mangas')
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        mangas = cursor.fetchall()
+    finally:
+        close_connection(conn)
+
+    next_after = None
+    if len(mangas) > limit:
+        mangas = mangas[:limit]
+        next_after = mangas[-1]["id"]
+    return mangas, next_after
+
+def iter_catalogue(availability=None, chunk_size=DB_BATCH_SIZE):
+    """Yield the catalogue in id order, as lists of up to `chunk_size` rows.
+
+    Each chunk is one keyset query on a connection borrowed just for it, so a
+    slow reader never holds a pooled connection between chunks.
+    """
+    query = "SELECT id, asin, url, title, price, availability, rating, cover FROM manga WHERE id > %s"
+    params = []
+    if availability in ("Yes", "No"):
+        query += " AND is_available = %s"
+        params.append(availability == "Yes")
+    query += " ORDER BY id LIMIT %s"
+
+    after_id = 0
+    while True:
+        conn = create_connection(input_msg='Export Catalogue')
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, [after_id, *params, chunk_size])
+            rows = cursor.fetchall()
+        finally:
+            close_connection(conn)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after_id = rows[-1]["id"]
+
+def search_mangas(text, page=1, page_size=LIST_PAGE_SIZE, availability=None, group=False):
+    """Full-text search over titles and plots; see `search.search` and `search.search_series`."""
+    conn = create_connection(input_msg='Search')
+    try:
+        cursor = conn.cursor(dictionary=True)
+        find = search_series if group else search
+        return find(cursor, text, page, page_size, availability)
+    finally:
+        close_connection(conn)
+
+def get_series(series):
+    conn = create_connection(input_msg='Series')
+    try:
+        return series_volumes(conn.cursor(dictionary=True), series)
+    finally:
+        close_connection(conn)
+
+def get_cover(manga_id, size):
+    """Return `(image_bytes, remote_url)` for a cover thumbnail.
+
+    Thumbnails are cached on disk by content hash, so volumes sharing a cover
+    share their thumbnails. On a miss every configured size is generated at
+    once from the stored blob. When no usable blob is stored, `image_bytes` is
+    None and `remote_url` is the original cover URL, if any.
+    """
+    conn = create_connection(input_msg='Cover')
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT cover_hash, cover FROM manga WHERE id = %s", (manga_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None, None
+        content_hash, cover_url = row
+        if not content_hash:
+            return None, cover_url
+
+        data = cover_cache.get(f"{content_hash}-{size}.webp")
+        if data is not None:
+            return data, None
+        blob = load_blob(cursor, content_hash)
+    finally:
+        close_connection(conn)
+    if not blob:
+        return None, cover_url
+
+    try:
+        for name, width in COVER_SIZES.items():
+            thumbnail = render_thumbnail(blob, width)
+            cover_cache.put(f"{content_hash}-{name}.webp", thumbnail)
+            if name == size:
+                data = thumbnail
+    except Exception as e:
+        logger.error(f"Unable to resize cover for Manga's ID: {manga_id}: {e}")
+        return None, cover_url
+    return data, None
+
+def get_manga_history(manga_id, start, end, buckets=100):
+    conn = create_connection(input_msg='Manga History')
+    try:
+        return get_history(conn.cursor(), manga_id, start, end, buckets)
+    finally:
+        close_connection(conn)
+
+def fetch_missing_covers(limit=500):
+    """Schedule covers that were never stored, e.g. after a crash or a failed download.
+
+    Cover URLs whose last download failed are skipped until their `retry_after`.
+    """
+    conn = create_connection(input_msg='Missing Covers')
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT m.id, m.cover FROM manga m "
+            "LEFT JOIN cover_sources s ON s.url_hash = SHA2(m.cover, 256) "
+            "WHERE m.cover_hash IS NULL AND m.cover IS NOT NULL "
+            "AND (s.retry_after IS NULL OR s.retry_after <= %s) LIMIT %s",
+            (time.time(), limit)
+        )
+        missing = cursor.fetchall()
+    finally:
+        close_connection(conn)
+    if missing:
+        cover_fetcher.submit(missing)
+    return len(missing)
+
+def scrape_url(url_id, url):
+    asin, url = canonical_url(url)
+    if asin is None:
+        raise ValueError("Not an Amazon product URL")
+    product, (etag, last_modified) = fetch_product(url)
+    if not is_complete(product):
+        raise ValueError(f"No product data found for {url}")
+
+    title = product["title"]
+
+    # Retrive Availability
+    availability = 'No' if product["out_of_stock"] else 'Yes'
+
+    # Optional fields missing from the page, reported in a single record
+    missing = [field for field in ("price", "rating", "trama", "cover") if product[field] is None]
+    if missing:
+        logger.warning(f"Missing {', '.join(missing)} for {title}")
+
+    # Retrive Price
+    price = product["price"]
+    # Ensure `price` has a default value if None
+    if price is None:
+        price = ""  # Set price to an empty string if not found
+        availability = 'No'
+
+    # Retrive Rating
+    rating = product["rating"]
+    # Ensure `rating` has a default value if None
+    if rating is None:
+        rating = ""  # Set price to an empty string if not found
+
+    # Retrive Trama
+    trama = product["trama"]
+
+    # Retrive Cover
+    # Downloaded later by the cover fetcher, not while the page is being scraped
+    image_url = product["cover"]
+
+    volume_json = {
+        "title": title,
+        "url": url,
+        "price": price,
+        "availability": availability,
+        "rating": rating,
+        "trama": trama,
+        "cover": image_url
+    }
+
+    # Clean price
+    if price:
+        cleaned_price = re.sub(r'[^\d,]', '', price).replace(',', '.')
+        cleaned_price = float(cleaned_price) if cleaned_price else None
+    else:
+        cleaned_price = 0.00
+
+    # Prepare the values, replacing None with a suitable value (like `None` for SQL)
+    values = (
+        volume_json["title"],
+        volume_json["url"],
+        cleaned_price if cleaned_price else 0.00,
+        volume_json["availability"],
+        volume_json["rating"].replace(',', '.'),  # Replace comma with a dot for numeric format
+        volume_json["trama"],  # This can remain as None
+        volume_json["cover"],
+        product_fingerprint(product),
+        etag,
+        last_modified,
+        asin,
+        *parse_series(volume_json["title"]),
+    )
+    return url_id, values
+
+def _write_scraped(cursor, results, lease_token):
+    """Upsert scraped volumes and ack their queue items; returns the ids of the new titles by ASIN."""
+    url_ids = [url_id for url_id, _ in results]
+    rows = [values for _, values in results]
+    records = [dict(zip(MANGA_COLUMNS, row)) for row in rows]
+    asins = [record["asin"] for record in records]
+    placeholders = ", ".join(["%s"] * len(asins))
+    cursor.execute(f"SELECT asin FROM manga WHERE asin IN ({placeholders})", asins)
+    known = {asin for (asin,) in cursor.fetchall()}
+    new_rows = [row for row, record in zip(rows, records) if record["asin"] not in known]
+    known_rows = [row for row, record in zip(rows, records) if record["asin"] in known]
+    if known_rows:
+        # Titles scraped before only get their metadata refreshed
+        cursor.executemany(INSERT_MANGA_SQL, known_rows)
+    new_ids = {}
+    if new_rows:
+        cursor.executemany(INSERT_MANGA_SQL, new_rows)
+        # Look the new ids up: a batch insert does not guarantee consecutive ones
+        new_asins = {record["asin"] for record in records if record["asin"] not in known}
+        cursor.execute(
+            f"SELECT id, asin FROM manga WHERE asin IN ({', '.join(['%s'] * len(new_asins))})",
+            tuple(new_asins),
+        )
+        new_ids = {asin: manga_id for manga_id, asin in cursor.fetchall()}
+        # First observation of every new title
+        record_initial(cursor, list(new_ids.values()), time.time())
+    url_queue.ack(cursor, url_ids, lease_token)
+    bump_catalogue_version(cursor)
+    return new_ids
+
+def flush_scraped(conn, results, lease_token):
+    """Write a batch of scraped volumes and ack their queue items in one transaction.
+
+    When the batch fails, its rows are retried one transaction each, so a
+    single bad page does not fail the whole batch. Returns `(url_id, error)`
+    for the rows that could not be written.
+    """
+    if not results:
+        return []
+    cursor = conn.cursor()
+    url_ids = [url_id for url_id, _ in results]
+    new_ids = {}
+    failed = []
+    try:
+        with timed("db_write"):
+            try:
+                new_ids = _write_scraped(cursor, results, lease_token)
+                conn.commit()
+            except Error as e:
+                conn.rollback()
+                if len(results) == 1:
+                    logger.error(f"Error writing scraped URL ID {url_ids[0]}: {e}")
+                    return [(url_ids[0], e)]
+                logger.warning(f"Error writing scraped batch {url_ids}, retrying row by row: {e}")
+                for result in results:
                     try:
-                        cursor.execute(sql, values)
+                        new_ids.update(_write_scraped(cursor, [result], lease_token))
                         conn.commit()
-                        logger.info('*****************************************************************')
-                        logger.info(f"Records added for Manga's ID:{url_id} to the DB")
-                        logger.info('*****************************************************************')
                     except Error as e:
-                        logger.error("----")
-                        logger.error(f"Error: {e}")
-                        logger.error("----")
+                        conn.rollback()
+                        logger.error(f"Error writing scraped URL ID {result[0]}: {e}")
+                        failed.append((result[0], e))
+    finally:
+        cursor.close()
+    logger.info(f"Records added for {len(new_ids)} mangas, URL IDs {url_ids} done, {len(failed)} failed")
+    # Covers are fetched concurrently in the background
+    records = [dict(zip(MANGA_COLUMNS, values)) for _, values in results]
+    covers = {record["asin"]: record["cover"] for record in records}
+    targets = [(manga_id, covers[asin]) for asin, manga_id in new_ids.items()]
+    if targets:
+        cover_fetcher.submit(targets)
+    return failed
 
-                except Error as e:
-                    logger.error("----")
-                    logger.error(f"Error: {e}")
-                    logger.error("----")
-                sleep(3)
+def drain_queue(handler, flush, input_msg, workers=SCRAPER_WORKERS, keep_running=None):
+    """Process the URL queue with up to `workers` concurrent workers.
 
-                delete_stmt = 'DELETE FROM urls WHERE id = %s'
+    Each worker leases a batch of items, calls `handler(item_id, url)` for each
+    and writes the results with `flush(conn, results, lease_token)`, which acks
+    them and returns `(item_id, error)` for the ones it could not write. The lease is renewed once half of it has gone by, and items leased
+    away to another worker in the meantime are skipped. Failed
+    items are nacked and retried later with backoff. Items whose host served a
+    block page or is cooling down are released without counting the attempt,
+    until the host's circuit closes. A batch whose write or nacks fail
+    unexpectedly is logged and released, without stopping the run. Workers
+    only borrow a pooled connection around each queue operation and write,
+    never while a page is fetched. When `keep_running()` turns false, e.g.
+    the scheduler lease was lost, workers stop before claiming another batch.
+    Returns the number of items that were ready when the run started.
+    """
+    with pooled_connection(input_msg) as conn:
+        ready = url_queue.count_ready(conn)
+    if not ready:
+        return 0
+
+    def worker():
+        while True:
+            if keep_running is not None and not keep_running():
+                logger.warning(f"{input_msg} stopped: this worker may no longer run the job")
+                return
+            with pooled_connection(input_msg) as conn:
+                token, items = url_queue.claim(conn, limit=SCRAPE_FLUSH_SIZE)
+            if not items:
+                return
+            renew_at = time.monotonic() + url_queue.lease_seconds / 2
+            held = {item_id for item_id, _, _ in items}
+            results = []
+            for item_id, url, attempts in items:
+                # Pages wait on the host throttle: keep the lease alive for the rest of the batch
+                if time.monotonic() >= renew_at:
+                    with pooled_connection(input_msg) as conn:
+                        held = set(url_queue.extend(conn, token))
+                    renew_at = time.monotonic() + url_queue.lease_seconds / 2
+                if item_id not in held:
+                    logger.warning(f"Lease on URL ID {item_id} lost, skipping it")
+                    continue
+                with log_context(url=url, url_id=item_id):
+                    start = time.perf_counter()
+                    try:
+                        results.append(handler(item_id, url))
+                        PAGES.labels(job=input_msg, outcome="success").inc()
+                        logger.info("Page scraped", extra={"duration": round(time.perf_counter() - start, 3)})
+                    except (BlockedError, CircuitOpenError) as e:
+                        # Not this URL's fault: hand it back, claimable once the host cooled down
+                        PAGES.labels(job=input_msg, outcome="deferred").inc()
+                        logger.info(f"{input_msg} deferred: {e}")
+                        with pooled_connection(input_msg) as conn:
+                            url_queue.release(conn, [item_id], token, available_at=host_throttle.retry_at(url))
+                    except Exception as e:
+                        PAGES.labels(job=input_msg, outcome="error").inc()
+                        logger.error(
+                            f"{input_msg} failed (attempt {attempts}): {e}",
+                            extra={"duration": round(time.perf_counter() - start, 3)},
+                        )
+                        with pooled_connection(input_msg) as conn:
+                            url_queue.nack(conn, item_id, token, e)
+            try:
+                with pooled_connection(input_msg) as conn:
+                    for item_id, error in flush(conn, results, token):
+                        url_queue.nack(conn, item_id, token, f"write failed: {error}")
+            except Exception as e:
+                # Keep the worker and the run going: the batch is retried a little later
+                logger.error(f"{input_msg} could not settle URL IDs {[item_id for item_id, _ in results]}: {e}")
                 try:
-                    cursor.execute(delete_stmt, (url_id,))
-                    logger.info("*********************************************")
-                    logger.info(f'Url: {url} with ID: {url_id} deleted from DB')
-                    logger.info("*********************************************")
-                    conn.commit()
-                except Error as e:
-                    logger.error("----")
-                    logger.error(f'Error: {e}')
-                    logger.error("----")
-
-            logger.info('*******************')
-            logger.info("All URLs processed.")
-            logger.info('*******************')
-        else:
-            logger.info('***************')
-            logger.info("No URLs found !")
-            logger.info('***************')
-    except Error as e:
-        logger.error("----")
-        logger.error(f"Error: {e}")
-        logger.error("----")
+                    with pooled_connection(input_msg) as conn:
+                        url_queue.release(
+                            conn, [item_id for item_id, _ in results], token,
+                            available_at=time.time() + url_queue.backoff_base,
+                        )
+                except Exception as e:
+                    logger.error(f"{input_msg} could not release its batch, the lease will expire: {e}")
+
+    workers = max(1, min(workers, -(-ready // SCRAPE_FLUSH_SIZE)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(bind_context(worker)) for _ in range(workers)]:
+            future.result()
+    return ready
+
+def url_scanner(keep_running=None):
+    ready = drain_queue(scrape_url, flush_scraped, input_msg='URL Scanner', keep_running=keep_running)
+    if ready and (keep_running is None or keep_running()):
+        fetch_missing_covers()
+        logger.info("All URLs processed.")
+    else:
+        logger.info("No URLs found !")
+
+def get_queue_depth():
+    conn = create_connection(input_msg='Queue Depth')
+    try:
+        return url_queue.depth(conn)
     finally:
         close_connection(conn)
 
+def refresh_gauges():
+    """Update the point-in-time gauges right before /metrics is rendered."""
+    for status, count in get_queue_depth().items():
+        QUEUE_DEPTH.labels(status=status).set(count)
+    stats = db_pool.stats()
+    DB_POOL.labels(state="in_use").set(stats["in_use"])
+    DB_POOL.labels(state="size").set(stats["size"])
+    for host, state in host_throttle.stats().items():
+        HOST_INTERVAL.labels(host=host).set(state["interval"])
+        HOST_CIRCUIT_OPEN.labels(host=host).set(state["circuit"] != "closed")
+
 def send_to_telegram(message):
-    logger.info("****************************")
-    logger.info("Telegram Message")
-    logger.info("****************************")
-    apiToken = os.getenv('TELE_BOT_TOKEN')
-    chatID = os.getenv('TELE_CHAT_ID')
-    apiURL = f'https://api.telegram.org/bot{apiToken}/sendMessage'
+    """Queue a Telegram message for the background dispatcher."""
+    conn = create_connection(input_msg='Telegram Message')
+    try:
+        cursor = conn.cursor()
+        enqueue_notification(cursor, message)
+        conn.commit()
+    except Error as e:
+        logger.error(f"Message not queued! {e}")
+    finally:
+        close_connection(conn)
+    telegram_dispatcher.wake()
 
+def postpone_check(manga_id):
+    """Push a failed title's next check out, from AVAILABILITY_MIN_INTERVAL
+    doubling on every consecutive failure up to AVAILABILITY_MAX_INTERVAL."""
+    now = time.time()
     try:
-        response = requests.post(apiURL, json={'chat_id': chatID, 'text': message})
-        print(response.text)
-    except Exception as e:
-        print(e)
-        logger.info("****************************")
-        logger.info(f"Message not sent! {e}")
-        logger.info("****************************")
+        with pooled_connection('Availability Worker') as conn:
+            cursor = conn.cursor()
+            # Assignments apply in order: the backoff uses the incremented count
+            cursor.execute(
+                "UPDATE manga SET check_failures = check_failures + 1, "
+                "next_check_at = %s + LEAST(%s, %s * POW(2, LEAST(check_failures - 1, 30))) WHERE id = %s",
+                (now, AVAILABILITY_MAX_INTERVAL, AVAILABILITY_MIN_INTERVAL, manga_id)
+            )
+            conn.commit()
+            cursor.close()
+    except Error as e:
+        logger.error(f"Unable to postpone the check of manga ID {manga_id}: {e}")
+
+def check_availability(manga):
+    """Check one title, backing its next check off when the check fails.
+
+    Blocked or cooling-down hosts are left to `run_in_pool`, which keeps the
+    title due for the next run.
+    """
+    try:
+        return _check_availability(manga)
+    except (BlockedError, CircuitOpenError):
+        raise
+    except Exception:
+        postpone_check(manga[0])
+        raise
+
+def _check_availability(manga):
+    """Re-check one title; returns a reschedule row when nothing changed.
+
+    Unchanged titles (304 Not Modified, or the same fingerprint as last
+    time) skip the price, history and notification logic entirely. Their
+    scheduling update is returned for `flush_reschedules` to batch. A pooled
+    connection is only borrowed for the writes, not while the page loads.
+    """
+    (manga_id, title, manga_url, availability_now, cover, volatility, price_now,
+     fingerprint_now, etag_now, last_modified_now) = manga
+    now = time.time()
+
+    # Retrive URL, conditionally when the last visit left validators
+    product, (etag, last_modified) = fetch_product(manga_url, (etag_now, last_modified_now))
+
+    if product is NOT_MODIFIED or (is_complete(product) and product_fingerprint(product) == fingerprint_now):
+        AVAILABILITY_CHECKS.labels(result="not_modified" if product is NOT_MODIFIED else "unchanged").inc()
+        volatility = update_volatility(volatility, False)
+        next_check_at = schedule_next_check(
+            now, availability_now == 'Yes', volatility,
+            AVAILABILITY_MIN_INTERVAL, AVAILABILITY_MAX_INTERVAL, AVAILABLE_CHECK_INTERVAL
+        )
+        return (now, next_check_at, volatility, etag, last_modified, manga_id)
+
+    if not is_complete(product):
+        # Unreadable page: retry later without touching the title's history
+        logger.warning("No product data, retrying later")
+        postpone_check(manga_id)
+        return
+
+    price = product["price"] or ""
+    cleaned_price = re.sub(r'[^\d,]', '', price).replace(',', '.')
+    cleaned_price = float(cleaned_price) if cleaned_price else None
+    availability = 'Yes' if price and not product["out_of_stock"] else 'No'
+    AVAILABILITY_CHECKS.labels(result="changed").inc()
+    changed = availability != availability_now
+    new_price = round(cleaned_price or 0.00, 2)
+    old_price = float(price_now or 0.00)
+    price_changed = availability == 'Yes' and new_price != old_price
+    volatility = update_volatility(volatility, changed)
+    next_check_at = schedule_next_check(
+        now, availability == 'Yes', volatility,
+        AVAILABILITY_MIN_INTERVAL, AVAILABILITY_MAX_INTERVAL, AVAILABLE_CHECK_INTERVAL
+    )
+
+    tg_message_to_send = None
+    if changed and availability == 'Yes':
+        outcome = "back in stock"
+        tg_message_to_send = (
+            "Hei this Manga is back to stock!\n\n"
+            f"{manga_url}\n\n"
+            f"Title: {title}\n\n"
+            f"🔺Price: {price}€\n"
+            f"{cover}"
+        )
+    elif availability == 'Yes' and availability_now == 'Yes' and price_drop(old_price, new_price, PRICE_DROP_ALERT_PCT):
+        drop = price_drop(old_price, new_price, PRICE_DROP_ALERT_PCT)
+        outcome = f"price dropped {drop:.0f}%"
+        tg_message_to_send = (
+            "Price drop on this Manga!\n\n"
+            f"{manga_url}\n\n"
+            f"Title: {title}\n\n"
+            f"🔻Price: {old_price:.2f}€ -> {new_price:.2f}€ (-{drop:.0f}%)\n"
+            f"{cover}"
+        )
+    elif changed:
+        outcome = "out of stock"
+    elif availability == 'No':
+        outcome = "still unavailable"
+    else:
+        outcome = "still available"
+
+    with pooled_connection('Availability Worker') as conn:
+        cursor = conn.cursor()
+        try:
+            write_start = time.perf_counter()
+            schedule = (
+                "last_checked_at = %s, next_check_at = %s, check_count = check_count + 1, volatility = %s, "
+                "fingerprint = %s, page_etag = %s, page_last_modified = %s, check_failures = 0"
+            )
+            scheduling = (now, next_check_at, volatility, product_fingerprint(product), etag, last_modified)
+            if changed or price_changed:
+                # Update the price, availability and scheduling columns, and
+                # append the change to the title's history
+                cursor.execute(
+                    f"UPDATE manga SET price = %s, availability = %s, stock_changes = stock_changes + %s, {schedule} "
+                    "WHERE id = %s",
+                    (new_price, availability, int(changed), *scheduling, manga_id)
+                )
+                record_change(cursor, manga_id, now, new_price, availability == 'Yes')
+                bump_catalogue_version(cursor)
+                if tg_message_to_send:
+                    # Delivered by the dispatcher once this transaction commits
+                    enqueue_notification(cursor, tg_message_to_send)
+            else:
+                cursor.execute(
+                    f"UPDATE manga SET {schedule} WHERE id = %s",
+                    (*scheduling, manga_id)
+                )
+            # Commit to DB
+            conn.commit()
+            STAGE_SECONDS.labels(stage="db_write").observe(time.perf_counter() - write_start)
+            logger.info(f"Checked: {outcome}", extra={"price": new_price, "available": availability})
+            if tg_message_to_send:
+                telegram_dispatcher.wake()
+        except Error:
+            # Logged by run_in_pool; check_availability backs the title off
+            conn.rollback()
+            raise
+
+def flush_reschedules(conn, rows):
+    """Reschedule a batch of unchanged titles in one transaction."""
+    cursor = conn.cursor()
+    try:
+        with timed("db_write"):
+            cursor.executemany(RESCHEDULE_MANGA_SQL, rows)
+            conn.commit()
+        logger.debug(f"{len(rows)} unchanged titles rescheduled")
+    except Error as e:
+        conn.rollback()
+        logger.error(f"Error rescheduling {len(rows)} unchanged titles: {e}")
+    finally:
+        cursor.close()
 
-def availability_scan(driver: WebDriver):
+def availability_scan(keep_running=None):
     conn = create_connection(input_msg='Availability Check')
     cursor = conn.cursor()
-    query = 'SELECT * FROM manga'
+    # Only titles that are due, and only the columns the check needs
+    query = '''
+        SELECT id, title, url, availability, cover, volatility, price,
+               fingerprint, page_etag, page_last_modified
+        FROM manga
+        WHERE next_check_at <= %s
+        ORDER BY next_check_at
+        LIMIT %s
+    '''
 
     try:
-        cursor.execute(query)
+        cursor.execute(query, (time.time(), AVAILABILITY_BATCH_LIMIT))
         manga_list = cursor.fetchall()
-        if manga_list:
-            for manga in manga_list:
-                manga_id = manga[0]
-                manga_url = manga[2]
-                title = manga[1]
-                cover = manga[7]
-                availability_now = manga[4]
-
-                logger.info("************************")
-                logger.info(f"Processing: {manga_id} ")
-                logger.info("************************")
-
-                # Retrive URL
-                driver.get(manga_url)
-                sleep(7)
-
-                if availability_now == 'No':
-                    price = None
-                    try:
-                        # Find the price element using JavaScript's querySelector
-                        price_element = driver.execute_script(
-                            'return document.querySelector(".a-section.a-spacing-none.aok-align-center.aok-relative span.aok-offscreen")'
-                        )
-                        # If not Null
-                        if price_element:
-                            # Get the text
-                            price = driver.execute_script("return arguments[0].textContent", price_element)
-                    except NoSuchElementException:
-                        # Catch exception if NoSuchElementException is raised
-                        logger.info("*******************************************")
-                        logger.info(f'Error retriving the Price for: {manga_url}')
-                        logger.info("*******************************************")
-                    # Ensure `price` has a default value if None
-                    if price is None:
-                        price = ""  # Set price to an empty string if not found
-                    
-                    if price:
-                        cleaned_price = re.sub(r'[^\d,]', '', price).replace(',', '.')
-                        cleaned_price = float(cleaned_price) if cleaned_price else None
-                        logger.info("***************************************")
-                        logger.info(f"Item ID: {manga_id} is back to stock !")
-                        logger.info("***************************************")
-                        availability = 'Yes'
-                        ##TODO: Add logic to send Telegram message
-                        tg_message_to_send = (
-                            "Hei this Manga is back to stock!\n\n"
-                            f"{manga_url}\n\n"
-                            f"Title: {title}\n\n"
-                            f"🔺Price: {price}€\n"
-                            f"{cover}"
-                        )
-
-                        send_to_telegram(tg_message_to_send)
-
-                        # Update the cover_bin, price and availability column
-                        try:
-                            update_query = "UPDATE manga SET price = %s, availability = %s WHERE id = %s"
-                            # Execute Query
-                            cursor.execute(update_query, (cleaned_price, availability, manga_id))
-                            logger.info("**************************************************************************")
-                            logger.info(f"ID: {manga_id} Updated! Price: {cleaned_price}, Available: {availability}")
-                            logger.info("**************************************************************************")
-                            # Commit to DB
-                            conn.commit()
-                        except Error as e:
-                            logger.error("----")
-                            logger.error(f"Error: {e}")
-                            logger.error("----")
-                        sleep(5)
-                    else:
-                        cleaned_price = 0.00
-                        logger.info("**************************")
-                        logger.info("Item Still unavailable ...")
-                        logger.info(f"Price: {cleaned_price}")
-                        logger.info("**************************")
-                else:
-                    logger.info("***********************************************")
-                    logger.info(f"Manga ID: {manga_id} Is Available ... Skipping")
-                    logger.info("***********************************************")
     except Error as e:
-        logger.error("----")
+        manga_list = None
         logger.error(f"Error: {e}")
-        logger.error("----")
     finally:
         close_connection(conn)
 
-def scan_url_call():
-    logger.info("*******************")
-    logger.info("URL Scanner Started")
-    logger.info("*******************")
-    yourScrapedDataUrls = None
+    if manga_list:
+        logger.info(f"{len(manga_list)} titles due for an availability check")
+        run_in_pool(
+            manga_list, check_availability, input_msg='Availability Worker', flush=flush_reschedules,
+            describe=lambda manga: {"manga_id": manga[0], "url": manga[2]}, keep_running=keep_running,
+        )
+    else:
+        logger.info("No titles due for an availability check")
+
+def record_page_latency(url, seconds, ready):
+    page_latencies.append(seconds)
+    if not ready:
+        logger.error(f"Page {url} not ready after {seconds:.2f}s")
+    elif seconds > PAGE_LATENCY_BUDGET:
+        logger.warning(f"Page {url} ready in {seconds:.2f}s, over the {PAGE_LATENCY_BUDGET}s budget")
+    else:
+        logger.debug(f"Page {url} ready in {seconds:.2f}s")
+
+def get_page_latency_stats():
+    samples = sorted(page_latencies)
+    if not samples:
+        return {"pages": 0}
+
+    def percentile(p):
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+    return {
+        "pages": len(samples),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "max": round(samples[-1], 3),
+        "over_budget": sum(1 for s in samples if s > PAGE_LATENCY_BUDGET),
+        "budget": PAGE_LATENCY_BUDGET,
+    }
+
+def load_page(driver: WebDriver, url, required=(), any_of=(), blockers=(), timeout=PAGE_READY_TIMEOUT):
+    """Navigate to `url` and return as soon as the elements we extract are present.
+
+    Returns True when the page became ready within `timeout` seconds. The time
+    from navigation to readiness is recorded against the latency budget.
+    """
+    # Respect the per-host concurrency and delay limits shared by all workers
+    with host_throttle.slot(url):
+        # Throttle waits are not page latency
+        start = time.monotonic()
+        driver.get(url)
+    ready = True
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.25).until(
+            lambda d: d.execute_script(PAGE_READY_SCRIPT, list(required), list(any_of), list(blockers))
+        )
+    except TimeoutException:
+        ready = False
+        FAILURES.labels(stage="navigation").inc()
+    STAGE_SECONDS.labels(stage="navigation").observe(time.monotonic() - start)
+    record_page_latency(url, time.monotonic() - start, ready)
+    return ready
+
+def fetch_product(url, validators=(None, None)):
+    """Extract the product fields for `url` with the configured backend.
+
+    Returns `(product, (etag, last_modified))`. Given the validators of a
+    previous visit, the HTTP backend sends a conditional request and returns
+    `NOT_MODIFIED` without parsing anything when the page is unchanged.
+    Pages read through Selenium have no validators. A 4xx response other
+    than 429 raises `requests.HTTPError` without the Selenium fallback.
+    """
+    if EXTRACTOR_BACKEND != 'selenium':
+        product = None
+        try:
+            with host_throttle.slot(url), timed("http_fetch"):
+                page_source, etag, last_modified = http_extractor.fetch_conditional(url, *validators)
+        except BlockedError:
+            host_throttle.record(url, BLOCKED)
+            FAILURES.labels(stage="blocked").inc()
+            raise
+        except requests.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and 400 <= status < 500:
+                # The host answered fine, this page is missing or refused: fail only this URL
+                host_throttle.record(url, OK)
+                raise
+            host_throttle.record(url, ERROR)
+            logger.error(f"HTTP fetch failed for {url}: {e}")
+        else:
+            host_throttle.record(url, OK)
+            if page_source is None:
+                return NOT_MODIFIED, (etag, last_modified)
+            with timed("extraction"):
+                product = parse_product(page_source)
+        if is_complete(product):
+            return product, (etag, last_modified)
+        if EXTRACTOR_BACKEND == 'http':
+            return product, (None, None)
+        logger.info(f"Falling back to Selenium for {url}")
+
+    # A browser session is only opened (or reused) once a page actually needs one
+    with driver_pool.session() as driver:
+        try:
+            ready = load_page(
+                driver, url, required=(TITLE_SELECTOR,), any_of=(PRICE_SELECTOR, OUT_OF_STOCK_SELECTOR),
+                blockers=(CAPTCHA_SELECTOR,),
+            )
+            with timed("extraction"):
+                product = extract_with_driver(driver)
+        except BlockedError:
+            host_throttle.record(url, BLOCKED)
+            FAILURES.labels(stage="blocked").inc()
+            raise
+        except WebDriverException:
+            host_throttle.record(url, ERROR)
+            raise
+        host_throttle.record(url, OK if ready else ERROR)
+        return product, (None, None)
+
+def create_driver():
     ff_options = webdriver.FirefoxOptions()
     ff_options.add_argument('--no-sandbox')
     ff_options.add_argument("headless")
     ff_options.add_argument('--disable-dev-shm-usage')
+    # Hand control back at DOMContentLoaded, readiness is checked by load_page
+    ff_options.page_load_strategy = 'eager'
+    return webdriver.Remote(SELENIUM_HUB_URL, options=ff_options)
 
-    try:
-        # DONT CHANGE THIS LINE
-        driver_urls = webdriver.Remote("http://selenium:4444/wd/hub", options=ff_options)
-        yourScrapedDataUrls = url_scanner(driver_urls)
-    except Exception as e:
-        logger.error("----")
-        logger.error(e)
-        logger.error("----")
-    finally:
-        driver_urls.quit()
+driver_pool = DriverPool(
+    create_driver,
+    max_sessions=SCRAPER_WORKERS,
+    max_pages=SESSION_MAX_PAGES,
+    max_memory_growth_mb=SESSION_MAX_MEMORY_GROWTH_MB,
+    idle_timeout=SESSION_IDLE_TIMEOUT,
+)
+
+def run_in_pool(items, handler, input_msg, workers=SCRAPER_WORKERS, flush=None, batch_size=None, describe=None,
+                keep_running=None):
+    """Spread `items` across up to `workers` worker threads.
+
+    Each worker calls `handler(item)` for every item it pulls from the shared
+    queue. Browser sessions and DB connections are leased by the handler only
+    when needed. A failing item is logged and does not stop the worker; items
+    hitting a blocked host are skipped. `describe(item)` returns the log
+    context fields for an item.
+
+    When `flush` is given, non-None handler results are buffered per worker and
+    written with `flush(conn, results)` every `batch_size` items and at the end,
+    on a connection borrowed for that write only. Once `keep_running()` turns
+    false, workers flush what they have and leave the remaining items.
+    """
+    batch_size = batch_size or SCRAPE_FLUSH_SIZE
+    work = queue.Queue()
+    for item in items:
+        work.put(item)
+
+    def flush_results(results):
+        with pooled_connection(input_msg) as conn:
+            flush(conn, results)
+
+    def worker():
+        results = []
+        try:
+            while True:
+                if keep_running is not None and not keep_running():
+                    logger.warning(f"{input_msg} stopped: this worker may no longer run the job")
+                    return
+                try:
+                    item = work.get_nowait()
+                except queue.Empty:
+                    return
+                with log_context(**(describe(item) if describe else {})):
+                    try:
+                        result = handler(item)
+                        PAGES.labels(job=input_msg, outcome="success").inc()
+                    except (BlockedError, CircuitOpenError) as e:
+                        # The item stays due and is retried by a later run
+                        PAGES.labels(job=input_msg, outcome="deferred").inc()
+                        logger.debug(f"{input_msg} deferred: {e}")
+                        continue
+                    except Exception as e:
+                        PAGES.labels(job=input_msg, outcome="error").inc()
+                        logger.error(f"{input_msg} failed: {e}")
+                        continue
+                if flush is not None and result is not None:
+                    results.append(result)
+                    if len(results) >= batch_size:
+                        flush_results(results)
+                        results = []
+        finally:
+            if flush is not None and results:
+                flush_results(results)
+
+    workers = max(1, min(workers, work.qsize()))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(bind_context(worker)) for _ in range(workers)]:
+            future.result()
+
+def scan_url_call(keep_running=None):
+    yourScrapedDataUrls = None
+
+    with log_context(job="scan_url_call", run_id=uuid.uuid4().hex[:12]), job_tracker.track("scan_url_call") as run:
+        logger.info("URL Scanner Started")
+        try:
+            yourScrapedDataUrls = url_scanner(keep_running)
+        except Exception as e:
+            run.fail(e)
+            logger.error(e)
+        finally:
+            driver_pool.close_idle()
     return yourScrapedDataUrls
 
-def availability_call():
-    logger.info("****************************")
-    logger.info("Availability Scanner Started")
-    logger.info("****************************")
+def availability_call(keep_running=None):
     yourScrapedDataUrls = None
-    ff_options = webdriver.FirefoxOptions()
-    ff_options.add_argument('--no-sandbox')
-    ff_options.add_argument("headless")
-    ff_options.add_argument('--disable-dev-shm-usage')
 
-    try:
-        # DONT CHANGE THIS LINE
-        driver_availability = webdriver.Remote("http://selenium:4444/wd/hub", options=ff_options)
-        yourScrapedDataUrls = availability_scan(driver_availability)
-    except Exception as e:
-        logger.error("----")
-        logger.error(e)
-        logger.error("----")
-    finally:
-        driver_availability.quit()
-    return yourScrapedDataUrls
\ No newline at end of file
+    with log_context(job="availability_call", run_id=uuid.uuid4().hex[:12]), job_tracker.track("availability_call") as run:
+        logger.info("Availability Scanner Started")
+        try:
+            yourScrapedDataUrls = availability_scan(keep_running)
+        except Exception as e:
+            run.fail(e)
+            logger.error(e)
+        finally:
+            driver_pool.close_idle()
+    return yourScrapedDataUrls
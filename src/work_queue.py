@@ -0,0 +1,285 @@
+from .schema import add_index_if_missing
+
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+# Queue bookkeeping columns added to the table holding the work items
+QUEUE_COLUMNS = (
+    ("status", "VARCHAR(12) NOT NULL DEFAULT 'pending'"),
+    ("attempts", "INT NOT NULL DEFAULT 0"),
+    ("available_at", "DOUBLE NOT NULL DEFAULT 0"),
+    ("lease_until", "DOUBLE NULL"),
+    ("lease_token", "VARCHAR(36) NULL"),
+    ("last_error", "TEXT NULL"),
+)
+
+
+class WorkQueue:
+    """Durable work queue on top of a SQL table with claim/lease semantics.
+
+    Workers claim ready items under a lease. An item whose lease expires (the
+    worker died or hung) becomes claimable again. Failures are retried with
+    exponential backoff and moved to the dead state after `max_attempts`.
+    Claims are single atomic UPDATEs, so concurrent workers and processes never
+    receive the same item. Every claim has its own lease token: workers
+    `extend` the lease while they are still busy, and ack/nack/release only
+    touch rows still leased under their token, so a worker whose lease expired
+    cannot overwrite the item's new owner.
+
+    Works against MySQL and, for local testing, SQLite (`dialect="sqlite"`).
+    Timestamps are epoch seconds so both dialects compare them the same way.
+
+    With `key_column`, items carry a key under a unique index and enqueuing
+    an item whose key is already queued (in any state) is a no-op.
+    """
+
+    def __init__(self, table="urls", dialect="mysql", lease_seconds=900, max_attempts=5,
+                 backoff_base=60, backoff_max=3600, key_column=None):
+        self.table = table
+        self.key_column = key_column
+        self.dialect = dialect
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _sql(self, query):
+        return query.replace("%s", "?") if self.dialect == "sqlite" else query
+
+    def _execute(self, cursor, query, params=()):
+        cursor.execute(self._sql(query), params)
+
+    def _placeholders(self, count):
+        return ", ".join(["%s"] * count)
+
+    def create_table(self, conn):
+        """Create a standalone queue table (SQLite stand-in and tests)."""
+        id_column = "INTEGER PRIMARY KEY AUTOINCREMENT" if self.dialect == "sqlite" else "INT AUTO_INCREMENT PRIMARY KEY"
+        columns = ", ".join(f"{name} {definition}" for name, definition in QUEUE_COLUMNS)
+        if self.key_column:
+            columns += f", {self.key_column} VARCHAR(64) NULL UNIQUE"
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (id {id_column}, url TEXT, {columns})")
+        self.create_index(cursor)
+        conn.commit()
+
+    def create_index(self, cursor):
+        if self.dialect == "sqlite":
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_ready ON {self.table} (status, available_at)")
+            return
+        add_index_if_missing(cursor, self.table, f"idx_{self.table}_ready", "status, available_at")
+
+    def enqueue(self, cursor, urls):
+        """Add items as pending; runs inside the caller's transaction.
+
+        With a `key_column`, `urls` are `(key, url)` pairs and items whose key
+        is already in the table are skipped, except dead ones, which go back
+        to pending with a fresh attempt budget. Returns the number of items
+        added or revived.
+        """
+        if not urls:
+            return 0
+        if not self.key_column:
+            cursor.executemany(
+                self._sql(f"INSERT INTO {self.table} (url, status, available_at) VALUES (%s, %s, %s)"),
+                [(url, PENDING, 0) for url in urls],
+            )
+            return len(urls)
+        ignore = "OR IGNORE" if self.dialect == "sqlite" else "IGNORE"
+        cursor.executemany(
+            self._sql(
+                f"INSERT {ignore} INTO {self.table} ({self.key_column}, url, status, available_at) "
+                "VALUES (%s, %s, %s, %s)"
+            ),
+            [(key, url, PENDING, 0) for key, url in urls],
+        )
+        added = cursor.rowcount
+        self._execute(
+            cursor,
+            f"UPDATE {self.table} SET status = '{PENDING}', attempts = 0, available_at = 0, lease_token = NULL, "
+            f"lease_until = NULL, last_error = NULL "
+            f"WHERE {self.key_column} IN ({self._placeholders(len(urls))}) AND status = '{DEAD}'",
+            tuple(key for key, _ in urls),
+        )
+        return added + cursor.rowcount
+
+    def _ready_condition(self):
+        return (
+            f"((status = '{PENDING}' AND available_at <= %s)"
+            f" OR (status = '{LEASED}' AND lease_until < %s AND attempts < {int(self.max_attempts)}))"
+        )
+
+    def _count_ready_statement(self, now):
+        return f"SELECT COUNT(*) FROM {self.table} WHERE {self._ready_condition()}", (now, now)
+
+    def _claim_statement(self, token, now, limit):
+        assignments = (
+            f"status = '{LEASED}', lease_token = %s, lease_until = %s, attempts = attempts + 1"
+        )
+        params = (token, now + self.lease_seconds, now, now, limit)
+        if self.dialect == "sqlite":
+            return (
+                f"UPDATE {self.table} SET {assignments} WHERE id IN "
+                f"(SELECT id FROM {self.table} WHERE {self._ready_condition()} ORDER BY id LIMIT %s)",
+                params,
+            )
+        # Locking read: rows leased by a concurrent claim no longer match
+        return (
+            f"UPDATE {self.table} SET {assignments} WHERE {self._ready_condition()} ORDER BY id LIMIT %s",
+            params,
+        )
+
+    def hot_queries(self, now):
+        """The claim and ready-count statements as `(name, sql, params)`, for EXPLAIN checks."""
+        return (
+            ("queue claim", *self._claim_statement(str(uuid.UUID(int=0)), now, 20)),
+            ("queue ready count", *self._count_ready_statement(now)),
+        )
+
+    def count_ready(self, conn):
+        cursor = conn.cursor()
+        self._execute(cursor, *self._count_ready_statement(time.time()))
+        count = cursor.fetchone()[0]
+        cursor.close()
+        # Don't leave a read snapshot open on pooled MySQL connections
+        conn.commit()
+        return count
+
+    def reap(self, conn):
+        """Move items whose last lease expired on their final attempt to dead."""
+        cursor = conn.cursor()
+        self._execute(
+            cursor,
+            f"UPDATE {self.table} SET status = '{DEAD}', lease_token = NULL, lease_until = NULL, "
+            f"last_error = 'lease expired on final attempt' "
+            f"WHERE status = '{LEASED}' AND lease_until < %s AND attempts >= %s",
+            (time.time(), self.max_attempts),
+        )
+        reaped = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return reaped
+
+    def claim(self, conn, limit=1):
+        """Lease up to `limit` ready items; returns `(lease_token, [(id, url, attempts), ...])`."""
+        self.reap(conn)
+        now = time.time()
+        token = str(uuid.uuid4())
+        cursor = conn.cursor()
+        self._execute(cursor, *self._claim_statement(token, now, limit))
+        conn.commit()
+        self._execute(
+            cursor,
+            f"SELECT id, url, attempts FROM {self.table} WHERE lease_token = %s ORDER BY id",
+            (token,),
+        )
+        items = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        return token, items
+
+    def extend(self, conn, token):
+        """Renew the lease of the items still held under `token`; returns their ids."""
+        cursor = conn.cursor()
+        self._execute(
+            cursor,
+            f"UPDATE {self.table} SET lease_until = %s WHERE lease_token = %s AND status = '{LEASED}'",
+            (time.time() + self.lease_seconds, token),
+        )
+        conn.commit()
+        self._execute(cursor, f"SELECT id FROM {self.table} WHERE lease_token = %s", (token,))
+        held = [item_id for (item_id,) in cursor.fetchall()]
+        cursor.close()
+        conn.commit()
+        return held
+
+    def ack(self, cursor, ids, token):
+        """Mark items done; runs inside the caller's transaction. Returns how many were still ours."""
+        if not ids:
+            return 0
+        self._execute(
+            cursor,
+            f"UPDATE {self.table} SET status = '{DONE}', lease_token = NULL, lease_until = NULL, last_error = NULL "
+            f"WHERE id IN ({self._placeholders(len(ids))}) AND lease_token = %s",
+            (*ids, token),
+        )
+        return cursor.rowcount
+
+    def nack(self, conn, item_id, token, error):
+        """Record a failed attempt: retry later with backoff, or move to dead.
+
+        Returns the new status, or None when the lease was lost to another worker.
+        """
+        cursor = conn.cursor()
+        self._execute(
+            cursor, f"SELECT attempts FROM {self.table} WHERE id = %s AND lease_token = %s", (item_id, token)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            cursor.close()
+            conn.commit()
+            return None
+        attempts = row[0]
+        if attempts >= self.max_attempts:
+            status, available_at = DEAD, 0
+        else:
+            status = PENDING
+            available_at = time.time() + min(self.backoff_max, self.backoff_base * 2 ** max(0, attempts - 1))
+        self._execute(
+            cursor,
+            f"UPDATE {self.table} SET status = %s, available_at = %s, lease_token = NULL, lease_until = NULL, "
+            f"last_error = %s WHERE id = %s AND lease_token = %s",
+            (status, available_at, str(error)[:2000], item_id, token),
+        )
+        conn.commit()
+        cursor.close()
+        if status == DEAD:
+            logger.error(f"Queue item {item_id} moved to dead after {attempts} attempts: {error}")
+        return status
+
+    def release(self, conn, ids, token, available_at=None):
+        """Give leased items back without counting the attempt, claimable again from `available_at`."""
+        if not ids:
+            return
+        cursor = conn.cursor()
+        delay = ", available_at = %s" if available_at is not None else ""
+        self._execute(
+            cursor,
+            f"UPDATE {self.table} SET status = '{PENDING}', attempts = attempts - 1{delay}, "
+            f"lease_token = NULL, lease_until = NULL WHERE id IN ({self._placeholders(len(ids))}) "
+            f"AND status = '{LEASED}' AND lease_token = %s",
+            (*(() if available_at is None else (available_at,)), *ids, token),
+        )
+        conn.commit()
+        cursor.close()
+
+    def requeue_dead(self, conn, ids=None):
+        """Give dead items a fresh set of attempts."""
+        cursor = conn.cursor()
+        query = f"UPDATE {self.table} SET status = '{PENDING}', attempts = 0, available_at = 0 WHERE status = '{DEAD}'"
+        params = ()
+        if ids:
+            query += f" AND id IN ({self._placeholders(len(ids))})"
+            params = tuple(ids)
+        self._execute(cursor, query, params)
+        count = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return count
+
+    def depth(self, conn):
+        cursor = conn.cursor()
+        self._execute(cursor, f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status")
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 0}
+        counts.update(dict(cursor.fetchall()))
+        cursor.close()
+        conn.commit()
+        return counts